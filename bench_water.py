@@ -0,0 +1,194 @@
+"""
+Water benchmarks
+- runs headless with SDL's dummy video driver
+- results are written as json so solver changes can be compared over time
+
+usage:
+    python bench_water.py [--frames N] [--out results.json] [--compare old.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+import soragl as SORA
+
+SORA.initialize({"window_size": [320, 180], "framebuffer_size": [320, 180]})
+SORA.create_context()
+
+from scripts import water
+
+# ------------------------------- #
+# water bodies
+
+WATER_CASES = [
+    # width, resolution, splashes per frame -- lower resolution values give more springs
+    (300, 3, 0),
+    (300, 3, 8),
+    (1280, 1, 8),
+    (1280, 0.25, 8),
+    (4000, 0.25, 32),
+    (4000, 0.1, 256),
+]
+
+
+def make_water(width: int, resolution: float) -> water.Water:
+    """Create a water body that never sleeps"""
+    w = water.Water(width, 64, {"resolution": resolution, "sleep_energy": -1})
+    w.position.xy = (width / 2, 32)
+    return w
+
+
+def bench_water(width: int, resolution: float, splashes: int, frames: int) -> dict:
+    """Time the step + draw of one water body"""
+    w = make_water(width, resolution)
+    rng = random.Random(0)
+    SORA.DELTA = w.surface.clock.timestep
+    step_time = draw_time = 0.0
+    for _ in range(frames):
+        for _ in range(splashes):
+            w.splash(rng.randrange(len(w.surface)), rng.uniform(-20, 20))
+        start = time.perf_counter()
+        w.surface.advance(SORA.DELTA)
+        mid = time.perf_counter()
+        w.render()
+        end = time.perf_counter()
+        step_time += mid - start
+        draw_time += end - mid
+    return {
+        "width": width,
+        "resolution": resolution,
+        "springs": len(w.surface),
+        "splashes": splashes,
+        "frames": frames,
+        "ms_per_step": step_time / frames * 1000,
+        "ms_per_draw": draw_time / frames * 1000,
+        **measure_allocations(w, splashes, min(frames, 50)),
+    }
+
+
+def measure_allocations(w: water.Water, splashes: int, frames: int) -> dict:
+    """
+    Allocations made by a frame -- run separately since tracing slows everything down
+    - peak bytes: the most memory held at once during a frame
+    - blocks: net memory blocks left behind by a frame
+    """
+    rng = random.Random(1)
+    tracemalloc.start()
+    peak = 0
+    blocks = sys.getallocatedblocks()
+    for _ in range(frames):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(splashes):
+            w.splash(rng.randrange(len(w.surface)), rng.uniform(-20, 20))
+        w.surface.advance(SORA.DELTA)
+        w.render()
+        peak += tracemalloc.get_traced_memory()[1] - current
+    blocks = sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+    return {
+        "alloc_peak_bytes_per_frame": peak / frames,
+        "alloc_blocks_per_frame": blocks / frames,
+    }
+
+
+# ------------------------------- #
+# heightfield
+
+HEIGHTFIELD_GRIDS = (64, 128, 256, 512, 1024)
+
+
+def bench_heightfield(size: int, steps: int) -> dict:
+    """Time the heightfield step on a size x size grid"""
+    config = dict(water.HEIGHTFIELD_CONFIG, grid=(size, size))
+    # a deep + a shallow basin with a splash in the middle
+    bed = np.zeros((size, size))
+    bed[:, size // 2 :] = config["depth"] / 2
+    surface = water.HeightfieldSurface((size, size), 4.0, config, bed)
+    surface.depth[size // 2, size // 4] += config["depth"]
+    dt = surface.clock.dt
+    # warm up
+    surface.step(dt)
+    start = time.perf_counter()
+    for _ in range(steps):
+        surface.step(dt)
+    elapsed = time.perf_counter() - start
+    return {
+        "grid": size,
+        "cells": size * size,
+        "steps": steps,
+        "ms_per_step": elapsed / steps * 1000,
+    }
+
+
+# ------------------------------- #
+# reporting
+
+
+def compare(results: dict, old: dict):
+    """Print the timing ratio against an older run -- below 1 is faster"""
+    for section, key in (("water", ("width", "resolution", "splashes")), ("heightfield", ("grid",))):
+        previous = {tuple(r[k] for k in key): r for r in old.get(section, [])}
+        for r in results[section]:
+            o = previous.get(tuple(r[k] for k in key))
+            if not o:
+                continue
+            name = " ".join(f"{k}={r[k]}" for k in key)
+            print(f"{section:>12} {name:<40} x{r['ms_per_step'] / o['ms_per_step']:.2f}")
+
+
+def main():
+    """Run the benchmarks"""
+    parser = argparse.ArgumentParser(description="headless water benchmarks")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=50, help="heightfield steps")
+    parser.add_argument("--out", default="bench_water.json")
+    parser.add_argument("--compare", default=None, help="older results to compare with")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "time": time.time(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pygame": pygame.version.ver,
+            "machine": platform.machine(),
+        },
+        "water": [],
+        "heightfield": [],
+    }
+    print(f"{'width':>6} {'res':>4} {'springs':>8} {'splash':>7} {'ms/step':>9} {'ms/draw':>9} {'peak B':>9} {'blocks':>7}")
+    for width, resolution, splashes in WATER_CASES:
+        r = bench_water(width, resolution, splashes, args.frames)
+        results["water"].append(r)
+        print(
+            f"{width:>6} {resolution:>4g} {r['springs']:>8} {splashes:>7}"
+            f" {r['ms_per_step']:>9.4f} {r['ms_per_draw']:>9.4f}"
+            f" {r['alloc_peak_bytes_per_frame']:>9.0f} {r['alloc_blocks_per_frame']:>7.2f}"
+        )
+    print(f"{'grid':>10} {'ms/step':>10} {'ns/cell':>10}")
+    for size in HEIGHTFIELD_GRIDS:
+        r = bench_heightfield(size, args.steps)
+        results["heightfield"].append(r)
+        print(f"{size:>4}x{size:<5} {r['ms_per_step']:>10.3f} {r['ms_per_step'] * 1e6 / r['cells']:>10.2f}")
+
+    with open(args.out, "w") as file:
+        json.dump(results, file, indent=4)
+    print(f"results written to {args.out}")
+    if args.compare:
+        with open(args.compare, "r") as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,9 @@ from soragl import physics, base_objects, smath
 # ball
 
 class Ball(physics.Entity):
+    # fastest fall speed in pixels per second
+    TERMINAL_VELOCITY = 1200
+
     def __init__(self, radius: int):
         """Initialize the ball object"""
         super().__init__()
@@ -25,10 +28,15 @@ class Ball(physics.Entity):
         """Called when the object is ready."""
         self.add_component(self.c_sprite)
         self.add_component(base_objects.SpriteRenderer())
-        self.add_component(base_objects.Collision2DComponent())
+        self.add_component(
+            base_objects.Collision2DComponent(
+                shape=physics.CircleShape(self.radius), continuous=True
+            )
+        )
     
     #=== update
     def update(self):
         """Update ball"""
         self.velocity += physics.World2D.GRAVITY * SORA.DELTA
+        self.velocity.y = min(self.velocity.y, self.TERMINAL_VELOCITY)
 
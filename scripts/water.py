@@ -1,9 +1,13 @@
+import weakref
 import pygame
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
 from pygame import draw as pgdraw
 from pygame import math as pgmath
 
 import soragl as SORA
-from soragl import physics, base_objects, smath, signal
+from soragl import scene, physics, base_objects, smath, signal
 
 
 # ------------------------------- #
@@ -16,22 +20,813 @@ DEFAULT_CONFIG = {
     "tension": 0.3,
     "height": 0.5,
     "spread": 0.1,
+    # fixed timestep
+    "timestep": 1 / 60,
+    "substeps": 1,
+    "max_steps": 4,
+    "integrator": "explicit",
+    # mean spring energy below which the water stops simulating
+    "sleep_energy": 1e-4,
+    # entities moving slower than this (pixels per second) do not wake the water
+    "wake_speed": 30,
+    # columns that moved less than this (in pixels) are not redrawn
+    "redraw_tolerance": 0,
+    # buoyancy (x gravity when fully submerged) + drag (per second)
+    "buoyancy": 2.0,
+    "drag": 3.0,
+    # level of detail -- each level halves the springs of bodies outside the render distance
+    "max_lod": 3,
+    # worker processes stepping the WaterAspect -- 0 steps on the main thread
+    "workers": 0,
 }
 
+# the spring coefficients are per tick -- tuned at 60 ticks a second
+TICK = 1 / 60
 
-class WaterSpring:
-    def __init__(self, position, damping, tension):
-        """Initialize the water spring."""
-        self.position = pgmath.Vector2(position)
-        self.hvel = 0
-        self.damping = damping
-        self.tension = tension
+EXPLICIT = "explicit"
+SEMI_IMPLICIT = "semi-implicit"
+IMPLICIT = "implicit"
 
-    def update(self):
-        """Update the spring."""
-        self.hvel = self.hvel * self.damping + self.tension * -self.position.y
-        self.hvel *= self.damping
-        self.position.y += self.hvel
+
+# ------------------------------- #
+# spring kernels -- whole array operations
+
+
+def spread_springs(heights, velocities, spread, cuts, scratch, h: float = 1.0):
+    """Spread waves to neighbouring springs -- `cuts` are links that are not connected"""
+    diff = scratch[: len(heights) - 1]
+    np.subtract(heights[1:], heights[:-1], out=diff)
+    diff[cuts] = 0
+    if h != 1.0:
+        diff *= h
+    velocities[:-1] += spread[:-1] * diff
+    velocities[1:] -= spread[1:] * diff
+
+
+def spring_energy(heights, velocities, tension, out):
+    """Kinetic + displacement energy of each spring"""
+    np.multiply(velocities, velocities, out=out)
+    out += tension * heights * heights
+    return out
+
+
+def update_springs(
+    heights, velocities, damping, tension, floor, h: float = 1.0, integrator=EXPLICIT
+):
+    """Update the springs + clamp them to the bottom of the water -- `h` is in ticks"""
+    if h != 1.0:
+        damping = damping**h
+    velocities *= damping
+    velocities -= h * tension * heights
+    velocities *= damping
+    if integrator == SEMI_IMPLICIT:
+        # tension is solved against the new height -- stable for any step length
+        velocities /= 1 + h * h * tension * damping
+    heights += h * velocities
+    np.minimum(heights, floor, out=heights)
+
+
+def splash_springs(velocities, centers, impulses, radii, max_radius: int = 64):
+    """
+    Add a batch of splashes to the springs in one go
+    - each impulse is spread over a triangle of `radii` springs around its center
+    - the triangle is normalized, a splash adds the same total impulse at any radius
+    - centers + radii are in springs
+    """
+    if not len(centers):
+        return
+    radii = np.clip(radii, 1, max_radius)
+    width = int(np.ceil(radii.max()))
+    index = np.rint(centers).astype(np.intp)[:, None] + np.arange(-width, width + 1)
+    weights = 1 - np.abs(index - centers[:, None]) / radii[:, None]
+    valid = (weights > 0) & (index >= 0) & (index < len(velocities))
+    weights[~valid] = 0
+    total = weights.sum(axis=1)
+    total[total == 0] = 1
+    weights *= (impulses / total)[:, None]
+    velocities += np.bincount(
+        index[valid],
+        weights=weights[valid],
+        minlength=len(velocities),
+    )
+
+
+def sample_springs(xs, heights, points):
+    """Interpolated heights + slopes of the springs at `points` (same space as `xs`)"""
+    segment = np.clip(np.searchsorted(xs, points, side="right") - 1, 0, len(xs) - 2)
+    x0 = xs[segment]
+    y0 = heights[segment]
+    slopes = (heights[segment + 1] - y0) / (xs[segment + 1] - x0)
+    return y0 + slopes * (np.clip(points, xs[0], xs[-1]) - x0), slopes
+
+
+def implicit_springs(heights, velocities, damping, tension, spread, floor, cuts, h: float = 1.0):
+    """
+    Step the springs + the spread with backward euler
+    - one tridiagonal solve over every spring -- stable for any spread or step length
+    """
+    count = len(heights)
+    links = np.ones(max(count - 1, 0))
+    links[cuts] = 0
+    if h != 1.0:
+        damping = damping**h
+    stiffness = h * h * damping
+    coupling = stiffness * damping * spread
+    # spring i is pulled by the neighbours it is linked to
+    lower = np.zeros(count)
+    upper = np.zeros(count)
+    lower[1:] = -coupling[1:] * links
+    upper[:-1] = -coupling[:-1] * links
+    diag = 1 + stiffness * tension - lower - upper
+    new_heights = smath.solve_tridiagonal(
+        lower, diag, upper, heights + h * damping * damping * velocities
+    )
+    np.minimum(new_heights, floor, out=new_heights)
+    np.subtract(new_heights, heights, out=velocities)
+    velocities /= h
+    heights[:] = new_heights
+
+
+def step_springs(
+    heights, velocities, damping, tension, spread, floor, cuts, scratch, h: float = 1.0, integrator=EXPLICIT
+):
+    """Step the springs once with the chosen integrator"""
+    if integrator == IMPLICIT:
+        implicit_springs(heights, velocities, damping, tension, spread, floor, cuts, h)
+        return
+    spread_springs(heights, velocities, spread, cuts, scratch, h)
+    update_springs(heights, velocities, damping, tension, floor, h, integrator)
+
+
+# ------------------------------- #
+# worker processes -- step a slice of the shared packed arrays
+
+_SHARED = {}
+
+
+def _attach_shared(name: str, count: int):
+    """Map the packed arrays of a shared memory block -- older blocks are closed"""
+    if name not in _SHARED:
+        for old in list(_SHARED):
+            shm, arrays = _SHARED.pop(old)
+            del arrays
+            shm.close()
+        shm = shared_memory.SharedMemory(name=name)
+        _SHARED[name] = (shm, np.ndarray((6, count), dtype=np.float64, buffer=shm.buf))
+    return _SHARED[name][1]
+
+
+def _step_shared(name: str, count: int, lo: int, hi: int, cuts: list, steps: int, h: float, integrator):
+    """Step springs [lo, hi) of the shared arrays"""
+    heights, velocities, damping, tension, spread, floor = _attach_shared(name, count)[:, lo:hi]
+    cuts = np.array(cuts, dtype=np.intp)
+    scratch = np.zeros(hi - lo)
+    for _ in range(steps):
+        step_springs(heights, velocities, damping, tension, spread, floor, cuts, scratch, h, integrator)
+
+
+def _release_shared(shm):
+    """Free a shared memory block"""
+    try:
+        shm.close()
+    except BufferError:
+        # views are still alive -- the mapping goes with them
+        pass
+    shm.unlink()
+
+
+# ------------------------------- #
+# fixed timestep
+
+
+class WaterClock:
+    """
+    Water Clock
+    - accumulates frame time and hands out fixed steps
+    - at most `max_steps` steps are run per frame, leftover time is dropped
+    """
+
+    def __init__(self, config: dict):
+        """Initialize the water clock"""
+        self.timestep = config["timestep"]
+        self.substeps = max(1, int(config["substeps"]))
+        self.max_steps = config["max_steps"]
+        self.integrator = config["integrator"]
+        # length of a substep in seconds + ticks
+        self.dt = self.timestep / self.substeps
+        self.h = self.dt / TICK
+        self._accumulator = 0.0
+
+    def advance(self, delta: float) -> int:
+        """Add frame time -- returns the number of substeps to run"""
+        self._accumulator += delta
+        steps = min(int(self._accumulator / self.timestep), self.max_steps)
+        self._accumulator -= steps * self.timestep
+        if steps == self.max_steps:
+            # do not try to catch up after a hitch
+            self._accumulator = min(self._accumulator, self.timestep)
+        return steps * self.substeps
+
+
+# ------------------------------- #
+# water surface
+
+
+class WaterSurface(scene.Component):
+    """
+    Water Surface
+    - xs: x position of each spring (relative to the water sprite)
+    - heights: y offset of each spring
+    - velocities: vertical velocity of each spring
+
+    springs are stored as contiguous arrays and stepped all at once
+    - if a WaterAspect is in the world, the arrays are views into its packed storage
+    """
+
+    def __init__(self, width: int, section_w: int, config: dict, floor: float):
+        """Initialize the water surface"""
+        super().__init__()
+        self.width = width
+        self.section_w = section_w
+        self.xs = np.arange(0, width + section_w, section_w, dtype=np.float64)
+        count = len(self.xs)
+        # state
+        self.heights = np.zeros(count)
+        self.velocities = np.zeros(count)
+        # private
+        self._config = config
+        self._base_section_w = section_w
+        self._floor = float(floor)
+        self._volume = np.zeros(1)
+        self._cuts = np.zeros(0, dtype=np.intp)
+        self._scratch = np.zeros(count)
+        self._manager = None
+        self._slot = -1
+        self._splashes = []
+        # per spring coefficients
+        self.set_coefficients()
+        self.clock = WaterClock(config)
+        # sleeping
+        self.sleep_energy = config["sleep_energy"]
+        self.asleep = False
+
+    def __len__(self):
+        """Number of springs"""
+        return len(self.xs)
+
+    @property
+    def volume(self):
+        """Sum of the spring heights"""
+        return float(self._volume[0])
+
+    @property
+    def managed(self):
+        """If the surface is stepped by a WaterAspect"""
+        return self._manager is not None
+
+    def set_coefficients(self):
+        """Fill the per spring coefficients -- spread is scaled to keep the wave speed"""
+        count = len(self.xs)
+        scale = (self._base_section_w / self.section_w) ** 2
+        self.damping = np.full(count, self._config["damping"])
+        self.tension = np.full(count, self._config["tension"])
+        self.spread = np.full(count, self._config["spread"] * scale)
+        self.floor = np.full(count, self._floor)
+
+    def resample(self, section_w: int):
+        """Change the spring spacing -- the current wave shape is kept"""
+        if section_w == self.section_w:
+            return
+        if self._manager:
+            self._manager.sync()
+        xs = np.arange(0, self.width + section_w, section_w, dtype=np.float64)
+        self.heights = np.interp(xs, self.xs, self.heights)
+        self.velocities = np.interp(xs, self.xs, self.velocities)
+        self.xs = xs
+        self.section_w = section_w
+        self.set_coefficients()
+        self._volume = np.array([self.heights.sum()])
+        self._scratch = np.zeros(len(xs))
+        if self._manager:
+            self._manager.repack()
+
+    def bind(self, manager, start: int, end: int, slot: int):
+        """Point the surface arrays at a slice of the manager's packed storage"""
+        self._manager = manager
+        self._slot = slot
+        self.heights = manager.heights[start:end]
+        self.velocities = manager.velocities[start:end]
+        self.damping = manager.damping[start:end]
+        self.tension = manager.tension[start:end]
+        self.spread = manager.spread[start:end]
+        self.floor = manager.floor[start:end]
+        self._volume = manager.volumes[slot : slot + 1]
+
+    def unbind(self):
+        """Give the surface its own copy of the arrays"""
+        self._slot = -1
+        self.heights = self.heights.copy()
+        self.velocities = self.velocities.copy()
+        self.damping = self.damping.copy()
+        self.tension = self.tension.copy()
+        self.spread = self.spread.copy()
+        self.floor = self.floor.copy()
+        self._volume = self._volume.copy()
+
+    def energy(self):
+        """Mean energy of the springs"""
+        return float(
+            np.mean(spring_energy(self.heights, self.velocities, self.tension, self._scratch))
+        )
+
+    def sleep(self):
+        """Stop simulating -- the surface is flattened"""
+        self.asleep = True
+        self.heights.fill(0)
+        self.velocities.fill(0)
+        self._volume[0] = 0
+        if self._manager:
+            self._manager.rest(self)
+
+    def wake(self):
+        """Start simulating again"""
+        if not self.asleep:
+            return
+        self.asleep = False
+        if self._manager:
+            self._manager.wake(self)
+
+    # === splashes
+    def splash(self, x, impulse, radius):
+        """Queue splashes -- x + radius in pixels, applied together before the next step"""
+        self._splashes.append(
+            np.broadcast_arrays(
+                np.atleast_1d(np.asarray(x, dtype=np.float64)),
+                np.atleast_1d(np.asarray(impulse, dtype=np.float64)),
+                np.atleast_1d(np.asarray(radius, dtype=np.float64)),
+            )
+        )
+        self.wake()
+        if self._manager:
+            self._manager._splashed.add(self)
+
+    def apply_splashes(self):
+        """Add all the queued splashes to the springs"""
+        if not self._splashes:
+            return
+        x, impulses, radii = (np.concatenate(a) for a in zip(*self._splashes))
+        self._splashes.clear()
+        splash_springs(self.velocities, x / self.section_w, impulses, radii / self.section_w)
+
+    # === snapshots
+    # float64 layout: section_w, asleep, clock accumulator, count, heights, velocities
+    # - the accumulator is the surface's own clock, a WaterAspect's shared clock is saved by the aspect
+    SNAPSHOT_HEADER = 4
+
+    def snapshot_size(self):
+        """Bytes needed for a snapshot"""
+        return (self.SNAPSHOT_HEADER + 2 * len(self)) * 8
+
+    def snapshot(self, out=None):
+        """
+        Copy the surface state into one buffer -- `out` can be a preallocated writable buffer
+        - queued splashes are applied first, they are part of the saved velocities
+        """
+        if self._manager:
+            self._manager.sync()
+        self.apply_splashes()
+        count = len(self)
+        if out is None:
+            out = bytearray(self.snapshot_size())
+        data = np.frombuffer(out, dtype=np.float64, count=self.SNAPSHOT_HEADER + 2 * count)
+        data[0] = self.section_w
+        data[1] = self.asleep
+        data[2] = self.clock._accumulator
+        data[3] = count
+        data[4 : 4 + count] = self.heights
+        data[4 + count :] = self.velocities
+        return out
+
+    def restore(self, buffer):
+        """
+        Restore the state from a snapshot -- it must come from a surface of the same width
+        - splashes queued since the snapshot are dropped
+        """
+        data = np.frombuffer(buffer, dtype=np.float64)
+        section_w, asleep, accumulator, count = data[: self.SNAPSHOT_HEADER]
+        section_w, count = int(section_w), int(count)
+        if (
+            section_w < 1
+            or count != len(np.arange(0, self.width + section_w, section_w))
+            or len(data) != self.SNAPSHOT_HEADER + 2 * count
+        ):
+            raise ValueError("Snapshot does not match the water surface")
+        if self._manager:
+            self._manager.sync()
+            self._manager._splashed.discard(self)
+        self._splashes.clear()
+        self.resample(section_w)
+        self.heights[:] = data[4 : 4 + count]
+        self.velocities[:] = data[4 + count : 4 + 2 * count]
+        self._volume[0] = self.heights.sum()
+        self.clock._accumulator = accumulator
+        if asleep and not self.asleep:
+            self.sleep()
+        elif not asleep:
+            self.wake()
+
+    def spread_wave(self, h: float = 1.0):
+        """Spread waves around"""
+        spread_springs(
+            self.heights, self.velocities, self.spread, self._cuts, self._scratch, h
+        )
+
+    def update(self, h: float = 1.0):
+        """Update every spring"""
+        update_springs(
+            self.heights,
+            self.velocities,
+            self.damping,
+            self.tension,
+            self.floor,
+            h,
+            self.clock.integrator,
+        )
+        self._volume[0] = self.heights.sum()
+
+    def step(self, h: float = 1.0):
+        """Step the surface once"""
+        step_springs(
+            self.heights,
+            self.velocities,
+            self.damping,
+            self.tension,
+            self.spread,
+            self.floor,
+            self._cuts,
+            self._scratch,
+            h,
+            self.clock.integrator,
+        )
+        self._volume[0] = self.heights.sum()
+
+    def advance(self, delta: float):
+        """Run the fixed steps for `delta` seconds of frame time"""
+        if self.asleep:
+            return
+        self.apply_splashes()
+        for _ in range(self.clock.advance(delta)):
+            self.step(self.clock.h)
+        if self.energy() < self.sleep_energy:
+            self.sleep()
+
+
+# ------------------------------- #
+# water aspect -- steps every water surface in the world at once
+
+
+class WaterAspect(scene.Aspect):
+    """
+    Water Aspect
+    - packs the springs of every WaterSurface in the world into one set of arrays
+    - each surface becomes a view into the packed arrays
+    - all bodies are advanced with a single vectorized step
+    - the fixed timestep of the bodies is replaced by the aspect's `config`
+    - sleeping surfaces keep their (flat) slot until most of the packed springs are asleep
+    - only then are the arrays repacked without them -- a body that wakes in its slot is free
+
+    with `workers` set the step runs in a pool of processes
+    - the packed arrays are copied into shared memory + split on body boundaries
+    - the main thread keeps its own copy of the surfaces to render + splash
+    - results are taken in the next `handle` (or `sync`), so rendering is a step behind
+    """
+
+    FIELDS = ("heights", "velocities", "damping", "tension", "spread", "floor")
+
+    def __init__(self, config: dict = None):
+        super().__init__(WaterSurface)
+        self.priority = 17
+        self.clock_config = dict(DEFAULT_CONFIG, **config) if config else DEFAULT_CONFIG
+        self.clock = WaterClock(self.clock_config)
+        # packed storage
+        self.heights = np.zeros(0)
+        self.velocities = np.zeros(0)
+        self.damping = np.zeros(0)
+        self.tension = np.zeros(0)
+        self.spread = np.zeros(0)
+        self.floor = np.zeros(0)
+        self.volumes = np.zeros(0)
+        self.energies = np.zeros(0)
+        self.max_lod = self.clock_config["max_lod"]
+        self.workers = self.clock_config["workers"]
+        # private -- worker pool
+        self._pool = None
+        self._shm = None
+        self._shared = None
+        self._release = None
+        self._jobs = []
+        self._ranges = []
+        self._dispatched = np.zeros(0)
+        # private
+        self._lod_center = None
+        self._splashed = set()
+        self._repack = False
+        self._sleep_energy = np.zeros(0)
+        self._awake = np.zeros(0, dtype=bool)
+        self._resting = 0
+        self._members = set()
+        self._surfaces = []
+        self._offsets = np.zeros(1, dtype=np.intp)
+        self._cuts = np.zeros(0, dtype=np.intp)
+        self._scratch = np.zeros(0)
+
+    def repack(self):
+        """Repack before the next step"""
+        self._repack = True
+
+    def rest(self, surface):
+        """A surface fell asleep -- its slot is flat + stays packed until the next repack"""
+        slot = surface._slot
+        if slot < 0 or not self._awake[slot]:
+            return
+        self._awake[slot] = False
+        self._resting += int(self._offsets[slot + 1] - self._offsets[slot])
+        # most of the step is spent on flat springs
+        if 2 * self._resting > len(self.heights):
+            self.repack()
+
+    def wake(self, surface):
+        """A surface woke up -- it is stepped again in its slot, or packed in"""
+        slot = surface._slot
+        if slot < 0:
+            self.repack()
+        elif not self._awake[slot]:
+            self._awake[slot] = True
+            self._resting -= int(self._offsets[slot + 1] - self._offsets[slot])
+
+    def pack(self):
+        """Pack all awake water surfaces into contiguous storage"""
+        self.sync()
+        self._repack = False
+        for surface in self._surfaces:
+            surface.unbind()
+        self._members = set(self._world._components[self._targets[0]])
+        self._surfaces = []
+        for e in self.iterate_entities():
+            surface = e.get_component(WaterSurface)
+            surface._manager = self
+            # splashes queued before the surface was managed
+            if surface._splashes:
+                self._splashed.add(surface)
+            if not surface.asleep:
+                self._surfaces.append(surface)
+        self._offsets = np.zeros(len(self._surfaces) + 1, dtype=np.intp)
+        np.cumsum([len(s) for s in self._surfaces], out=self._offsets[1:])
+        for field in self.FIELDS:
+            setattr(
+                self,
+                field,
+                np.concatenate([getattr(s, field) for s in self._surfaces])
+                if self._surfaces
+                else np.zeros(0),
+            )
+        self.volumes = np.array([s.volume for s in self._surfaces])
+        self.energies = np.zeros(len(self._surfaces))
+        self._sleep_energy = np.array([s.sleep_energy for s in self._surfaces])
+        self._awake = np.ones(len(self._surfaces), dtype=bool)
+        self._resting = 0
+        # links between the last spring of a body and the first of the next
+        self._cuts = self._offsets[1:-1] - 1
+        self._scratch = np.zeros(len(self.heights))
+        if self.workers:
+            self.share()
+        for i, surface in enumerate(self._surfaces):
+            surface.bind(self, self._offsets[i], self._offsets[i + 1], i)
+
+    # === worker pool
+    def share(self):
+        """Copy the packed arrays into a new shared memory block"""
+        if self._release:
+            self._release()
+        count = len(self.heights)
+        if not count:
+            return
+        self._shm = shared_memory.SharedMemory(create=True, size=len(self.FIELDS) * count * 8)
+        self._release = weakref.finalize(self, _release_shared, self._shm)
+        self._shared = np.ndarray((len(self.FIELDS), count), dtype=np.float64, buffer=self._shm.buf)
+        for i, field in enumerate(self.FIELDS):
+            self._shared[i] = getattr(self, field)
+        # coefficients are only read -- share them with the surfaces
+        for i, field in enumerate(self.FIELDS[2:], 2):
+            setattr(self, field, self._shared[i])
+        self._dispatched = np.zeros(count)
+        # split the bodies into one range of springs per worker
+        bounds = np.searchsorted(
+            self._offsets, np.linspace(0, count, self.workers + 1)[1:-1]
+        )
+        bounds = np.unique(np.concatenate(([0], bounds, [len(self._surfaces)])))
+        self._ranges = [
+            (
+                int(self._offsets[b0]),
+                int(self._offsets[b1]),
+                (self._offsets[b0 + 1 : b1] - 1 - self._offsets[b0]).tolist(),
+            )
+            for b0, b1 in zip(bounds[:-1], bounds[1:])
+        ]
+
+    def dispatch(self, steps: int):
+        """Start the workers on the next steps"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+            # the workers are stopped with the aspect, or at exit if `close` was never called
+            weakref.finalize(self, self._pool.shutdown)
+        self._shared[0] = self.heights
+        self._shared[1] = self.velocities
+        self._dispatched[:] = self.velocities
+        self._jobs = [
+            self._pool.submit(
+                _step_shared,
+                self._shm.name,
+                len(self.heights),
+                lo,
+                hi,
+                cuts,
+                steps,
+                self.clock.h,
+                self.clock.integrator,
+            )
+            for lo, hi, cuts in self._ranges
+        ]
+
+    def sync(self):
+        """Wait for the workers + take their results -- splashes made meanwhile are kept"""
+        if not self._jobs:
+            return
+        for job in self._jobs:
+            job.result()
+        self._jobs = []
+        self.velocities -= self._dispatched
+        self.velocities += self._shared[1]
+        self.heights[:] = self._shared[0]
+        self.settle()
+
+    def close(self):
+        """Stop the workers + free the shared memory"""
+        self.sync()
+        if self._pool:
+            self._pool.shutdown()
+            self._pool = None
+        if self._release:
+            self._release()
+
+    def update_lods(self):
+        """Resample the bodies by their distance (in chunks) from the center chunk"""
+        self._lod_center = tuple(self._world._center_chunk)
+        cx, cy = self._lod_center
+        cpw, cph = self._world._options["chunkpixw"], self._world._options["chunkpixh"]
+        for water in self.iterate_entities():
+            if not isinstance(water, Water):
+                continue
+            r = water.rect
+            distance = max(
+                r.left // cpw - cx,
+                cx - (r.right - 1) // cpw,
+                r.top // cph - cy,
+                cy - (r.bottom - 1) // cph,
+                0,
+            )
+            water.set_lod(min(self.max_lod, max(0, distance - self._world.render_distance)))
+
+    def handle(self):
+        """Step every water body"""
+        self.sync()
+        changed = self._world._components[self._targets[0]] != self._members
+        if changed or tuple(self._world._center_chunk) != self._lod_center:
+            self.update_lods()
+        if changed or self._repack:
+            self.pack()
+        if not self._surfaces:
+            return
+        # all of the frame's splashes go in before the step
+        for surface in self._splashed:
+            surface.apply_splashes()
+        self._splashed.clear()
+        steps = self.clock.advance(SORA.DELTA)
+        if not steps:
+            return
+        if self.workers:
+            self.dispatch(steps)
+            return
+        for _ in range(steps):
+            self.step(self.clock.h)
+        self.settle()
+
+    def settle(self):
+        """Update the volumes + put calm bodies to sleep"""
+        np.add.reduceat(self.heights, self._offsets[:-1], out=self.volumes)
+        # put calm bodies to sleep
+        spring_energy(self.heights, self.velocities, self.tension, self._scratch)
+        np.add.reduceat(self._scratch, self._offsets[:-1], out=self.energies)
+        self.energies /= np.diff(self._offsets)
+        calm = np.flatnonzero(self._awake & (self.energies < self._sleep_energy))
+        for i in calm.tolist():
+            self._surfaces[i].sleep()
+
+    # === snapshots
+    def snapshot(self) -> dict:
+        """
+        Save every body + the shared clock -- keyed by entity hash
+        - Water bodies save their level too, restoring one body alone leaves the clock as is
+        """
+        self.sync()
+        state = {"clock": self.clock._accumulator}
+        for e in self.iterate_entities():
+            state[hash(e)] = (e if isinstance(e, Water) else e.get_component(WaterSurface)).snapshot()
+        return state
+
+    def restore(self, state: dict):
+        """Restore the bodies saved in a snapshot + the shared clock"""
+        for e in self.iterate_entities():
+            data = state.get(hash(e))
+            if data is not None:
+                (e if isinstance(e, Water) else e.get_component(WaterSurface)).restore(data)
+        self.clock._accumulator = state["clock"]
+
+    def step(self, h: float = 1.0):
+        """Step the packed springs once"""
+        step_springs(
+            self.heights,
+            self.velocities,
+            self.damping,
+            self.tension,
+            self.spread,
+            self.floor,
+            self._cuts,
+            self._scratch,
+            h,
+            self.clock.integrator,
+        )
+
+
+# ------------------------------- #
+# buoyancy aspect -- floats entities touching water
+
+
+class BuoyancyAspect(scene.Aspect):
+    """
+    Buoyancy Aspect
+    - pushes moving Collision2D entities up out of the water + drags them
+    - all entities in a body are handled with one surface query
+    - runs before the Collision2DAspect so the impulses are moved this frame
+    """
+
+    def __init__(self):
+        super().__init__(WaterSurface)
+        self.priority = 20
+
+    def iterate_movers(self):
+        """Iterate through the moving Collision2D entities"""
+        bodies = self._world._components.get(hash(base_objects.Collision2DComponent), ())
+        for entity in bodies:
+            entity = self._world._scene.get_entity(entity)
+            if not entity.static:
+                yield entity
+
+    def handle(self):
+        """Apply buoyancy + drag"""
+        movers = list(self.iterate_movers())
+        if not movers:
+            return
+        rects = np.array([tuple(e.rect) for e in movers], dtype=np.float64)
+        velocities = np.array([tuple(e.velocity) for e in movers])
+        left, top = rects[:, 0], rects[:, 1]
+        right, bottom = left + rects[:, 2], top + rects[:, 3]
+        heights = np.maximum(rects[:, 3], 1)
+        accel = np.zeros_like(velocities)
+        for water in self.iterate_entities():
+            if not isinstance(water, Water):
+                continue
+            r = water.rect
+            hit = np.flatnonzero(
+                (right > r.left) & (left < r.right) & (bottom > r.top) & (top < r.bottom)
+            )
+            if not len(hit):
+                continue
+            surface, _, _ = water.sample_surface(left[hit] + rects[hit, 2] / 2, clamp=True)
+            submerged = np.clip(bottom[hit] - surface, 0, heights[hit]) / heights[hit]
+            accel[hit, 1] -= physics.World2D.GRAVITY.y * water.buoyancy * submerged
+            # exponential drag -- never overshoots
+            accel[hit] += velocities[hit] * (
+                np.expm1(-water.drag * submerged * SORA.DELTA)[:, None] / max(SORA.DELTA, 1e-9)
+            )
+        dv = accel * SORA.DELTA
+        for i in np.flatnonzero(np.any(dv != 0, axis=1)).tolist():
+            movers[i].velocity.x += dv[i, 0]
+            movers[i].velocity.y += dv[i, 1]
+
+
+# ------------------------------- #
+# water entity
 
 
 class Water(physics.Entity):
@@ -39,27 +834,37 @@ class Water(physics.Entity):
         """Initialize the water object."""
         super().__init__()
         self.area = (width, height)
-        self.config = config if config else DEFAULT_CONFIG.copy()
+        self.config = dict(DEFAULT_CONFIG, **config) if config else DEFAULT_CONFIG.copy()
         self.splashed = set()
         # config parsing
         self.spread = self.config["spread"]
         self.damping = self.config["damping"]
         self.tension = self.config["tension"]
         self.w_height = 1 - self.config["height"]
+        self.buoyancy = self.config["buoyancy"]
+        self.drag = self.config["drag"]
+        self.wake_speed = self.config["wake_speed"]
         # points / 100px
         self.resolution = 100 / self.config["resolution"]
-        self.section_w = int(self.area[0] / self.resolution)
+        self.section_w = max(1, int(self.area[0] / self.resolution))
         self.const_volume = self.section_w / self.area[0]
-        # points
-        self.points = [
-            WaterSpring((i, 0), self.damping, self.tension)
-            for i in range(0, width + self.section_w, self.section_w)
-        ]
+        self.base_section_w = self.section_w
+        self.lod = 0
+        # springs
+        self.surface = WaterSurface(width, self.section_w, self.config, height)
+        self._drawn_asleep = False
+        # rendering -- the top of the water in each pixel column
+        self.redraw_tolerance = self.config["redraw_tolerance"]
+        self._columns = np.arange(width, dtype=np.float64) + 0.5
+        self._tops = np.full(width, float(height))
+        self._new_tops = np.zeros(width)
+        self._delta = np.zeros(width)
         # components
         self.c_sprite = base_objects.Sprite(self.area[0], self.area[1])
         self.sprite = self.c_sprite.sprite
         self.c_area = base_objects.Area2D(self.area[0], self.area[1])
         # add signal receiver
+        self.r_enterarea = self.c_area.enter_signal_register.add_receiver(signal.Receiver(self._on_entity_enter))
         self.r_overlaparea = self.c_area.overlap_signal_register.add_receiver(signal.Receiver(self._on_entity_overlap))
         self.r_exitarea = self.c_area.exit_signal_register.add_receiver(signal.Receiver(self._on_entity_exit))
 
@@ -67,30 +872,35 @@ class Water(physics.Entity):
         """Called when the object is ready."""
         self.add_component(self.c_sprite)
         self.add_component(base_objects.SpriteRenderer())
+        self.add_component(self.surface)
         # add collision body
         self.add_component(self.c_area)
-    
+
     def _on_entity_enter(self, other):
         """on entity enter area"""
-        pass
+        self.surface.wake()
 
     def _on_entity_overlap(self, other):
         """entity overlapping"""
         # print(self.rect, other.rect)
-        if id(other) in self.splashed: return
+        # floating entities do not disturb the water -- splashes wake it themselves
+        if other.velocity.length_squared() > self.wake_speed * self.wake_speed:
+            self.surface.wake()
+        if hash(other) in self.splashed: return
         if other.rect.bottom - self.position.y > self.w_height * self.area[1]:
-            location = self.xpoint_to_location(other.position.x)
-            self.splash(location, other.velocity.y)
-            self.splashed.add(id(other))
-        
+            # wider bodies push more of the surface
+            self.splash_at(other.position.x, other.velocity.y, other.rect.w)
+            self.splashed.add(hash(other))
+
     def _on_entity_exit(self, other):
         """entity leaving"""
-        self.splashed.remove(id(other))
+        self.splashed.discard(hash(other))
 
     def add_volume(self, volume):
         """Add volume to the water."""
         # negative because (pygame height stuff)
         self.w_height -= volume / self.area[0]
+        self.surface.wake()
 
     def remove_volume(self, volume):
         """Remove volume from the water."""
@@ -98,77 +908,396 @@ class Water(physics.Entity):
 
     def spread_wave(self):
         """Spread waves around"""
-        # update first point
-        self.points[0].hvel += self.spread * (
-            self.points[1].position.y - self.points[0].position.y
-        )
-        # update rest
-        for i in range(1, len(self.points) - 1):
-            self.points[i].hvel += self.spread * (
-                self.points[i + 1].position.y - self.points[i].position.y
-            ) + self.spread * (
-                self.points[i - 1].position.y - self.points[i].position.y
-            )
+        self.surface.spread_wave()
 
     def splash(self, location, velocity):
         """Splash the water."""
-        if 0 <= location < len(self.points):
-            self.points[location].hvel += velocity
+        if 0 <= location < len(self.surface):
+            self.surface.splash(location * self.section_w, velocity, self.section_w)
+
+    def splash_at(self, xpoints, velocities, widths=0):
+        """
+        Splash the water at world x positions -- scalars or arrays
+        - each splash is spread over its width, impacts are batched until the next step
+        """
+        self.surface.splash(
+            np.asarray(xpoints, dtype=np.float64) - (self.position.x - self.c_sprite.hwidth),
+            velocities,
+            np.asarray(widths, dtype=np.float64) / 2,
+        )
 
     def get_water_level_at(self, location):
         """Get the water level at a point"""
-        return self.points[location].position.y
+        return float(self.surface.heights[location])
 
     def xpoint_to_location(self, xpoint):
         """Convert a point to a location."""
         return int(
-            (xpoint - self.position.x + self.c_sprite.hwidth)
-            / self.area[0]
-            * len(self.points)
+            (xpoint - self.position.x + self.c_sprite.hwidth) / self.section_w + 0.5
         )
 
+    def snapshot_size(self):
+        """Bytes needed for a snapshot"""
+        return 8 + self.surface.snapshot_size()
+
+    def snapshot(self, out=None):
+        """Copy the water level + surface state into one buffer"""
+        if out is None:
+            out = bytearray(self.snapshot_size())
+        np.frombuffer(out, dtype=np.float64, count=1)[0] = self.w_height
+        self.surface.snapshot(memoryview(out)[8:])
+        return out
+
+    def restore(self, buffer):
+        """Restore the state from a snapshot -- it must come from a body of the same size"""
+        data = np.frombuffer(buffer, dtype=np.float64, count=2)
+        section_w = int(data[1])
+        lod = (section_w // self.base_section_w).bit_length() - 1
+        if lod < 0 or self.base_section_w << lod != section_w:
+            raise ValueError("Snapshot does not match the water body")
+        self.surface.restore(memoryview(buffer)[8:])
+        # spacing comes from the restored surface -- set_lod could clamp it
+        self.w_height = float(data[0])
+        self.lod = lod
+        self.section_w = self.surface.section_w
+        self.const_volume = self.section_w / self.area[0]
+        # redraw even if asleep
+        self._drawn_asleep = False
+
+    def set_lod(self, level: int):
+        """Resample the springs -- each level doubles the spacing between springs"""
+        while level and self.base_section_w << level > self.area[0]:
+            level -= 1
+        if level == self.lod:
+            return
+        self.lod = level
+        self.section_w = self.base_section_w << level
+        self.const_volume = self.section_w / self.area[0]
+        self.surface.resample(self.section_w)
+
+    def surface_top(self):
+        """World y of the surface where the springs are at rest"""
+        return (
+            self.position.y
+            - self.c_sprite.hheight
+            + self.area[1] * self.w_height
+            - self.surface.volume * self.const_volume
+        )
+
+    def sample_surface(self, xpoints, clamp: bool = False):
+        """
+        Sample the surface at an array of world x positions
+        - returns world y heights, slopes (dy/dx) + unit normals (pointing up)
+        - points outside of the water are NaN, or the nearest edge if `clamp`
+        - a single x gives a single height, slope + normal
+        """
+        scalar = np.ndim(xpoints) == 0
+        points = np.atleast_1d(np.asarray(xpoints, dtype=np.float64)) - (
+            self.position.x - self.c_sprite.hwidth
+        )
+        heights, slopes = sample_springs(self.surface.xs, self.surface.heights, points)
+        heights += self.surface_top()
+        if clamp:
+            slopes[(points < 0) | (points > self.area[0])] = 0
+        else:
+            outside = (points < 0) | (points > self.area[0])
+            heights[outside] = np.nan
+            slopes[outside] = np.nan
+        normals = np.empty(heights.shape + (2,))
+        length = np.sqrt(1 + slopes * slopes)
+        normals[..., 0] = slopes / length
+        normals[..., 1] = -1 / length
+        if scalar:
+            return float(heights[0]), float(slopes[0]), normals[0]
+        return heights, slopes, normals
+
     # === update
     def update(self):
-        self.sprite.fill((0, 0, 0, 0))
-        # testing
-        # if SORA.is_mouse_clicked(0):
-        #     # self.add_volume(10)
-        #     # and spread wave
-        #     x = self.xpoint_to_location(SORA.get_mouse_rel()[0])
-        #     self.splash(x, 40)
-
-        # self.sprite.fill(self.config["color"])
-        # draw each point
-        h = self.area[1] * self.w_height
-        self.spread_wave()
-
-        addition_volume = 0
-        for point in self.points:
-            point.update()
-            addition_volume += point.position.y
-            if point.position.y > self.area[1]:
-                point.position.y = self.area[1]
-        # print(addition_volume)
-        # calculate the extra height to add
-        # draw each point as a circle on SORA.FRAMEBUFFER
-        # for point in self.points:
-        #     pgdraw.circle(
-        #         SORA.FRAMEBUFFER,
-        #         (255, 255, 255),
-        #         (
-        #             int(self.position.x - self.c_sprite.hwidth + point.position.x),
-        #             int(self.position.y + point.position.y + h - self.c_sprite.hheight),
-        #         ),
-        #         3,
-        #     )
-
-        # draw polygon between points
-        pygame.draw.polygon(
-            self.sprite,
-            self.config["color"],
-            [
-                (p.position.x, p.position.y + h - addition_volume * self.const_volume)
-                for p in self.points
-            ]
-            + [(self.area[0], self.area[1]), (0, self.area[1])],
+        # stepped by the WaterAspect if there is one
+        if not self.surface.managed:
+            self.surface.advance(SORA.DELTA)
+        # calm water keeps its last sprite
+        if self.surface.asleep and self._drawn_asleep:
+            return
+        self._drawn_asleep = self.surface.asleep
+        self.render()
+
+    def render(self):
+        """Redraw the pixel columns where the surface moved"""
+        offset = self.area[1] * self.w_height - self.surface.volume * self.const_volume
+        tops = self._new_tops
+        tops[:] = np.interp(self._columns, self.surface.xs, self.surface.heights)
+        tops += offset
+        np.clip(tops, 0, self.area[1], out=tops)
+        np.rint(tops, out=tops)
+        # find the columns that moved
+        delta = self._delta
+        np.subtract(tops, self._tops, out=delta)
+        np.abs(delta, out=delta)
+        dirty = np.flatnonzero(delta > self.redraw_tolerance)
+        if not len(dirty):
+            return
+        # one fill per column -- grow the water up or clear down to the new top
+        color = self.config["color"]
+        for x, new, old in zip(
+            dirty.tolist(), tops[dirty].tolist(), self._tops[dirty].tolist()
+        ):
+            if new < old:
+                self.sprite.fill(color, (x, new, 1, old - new))
+            else:
+                self.sprite.fill((0, 0, 0, 0), (x, old, 1, new - old))
+        self._tops[dirty] = tops[dirty]
+
+
+# ------------------------------- #
+# 2D heightfield water -- shallow water on a grid
+
+HEIGHTFIELD_CONFIG = {
+    "color": (0, 0, 255, 159),
+    # cells across, cells down
+    "grid": (64, 64),
+    # starting water depth (pixels)
+    "depth": 8.0,
+    "gravity": 98,
+    # flux kept per step
+    "damping": 0.998,
+    # fixed timestep
+    "timestep": 1 / 60,
+    "substeps": 2,
+    "max_steps": 4,
+    "integrator": "explicit",
+    "sleep_energy": 1e-4,
+}
+
+
+def step_heightfield(bed, depth, flux_x, flux_y, links_x, links_y, dt, gravity, cell, damping):
+    """
+    Virtual pipe step
+    - flux_x / flux_y: volume flowing from a cell to its right / lower neighbour
+    - links_x / links_y: 1 where both cells are open, 0 across walls
+    """
+    area = cell * cell
+    surface = bed + depth
+    # accelerate the pipes by the height difference
+    flux_x *= damping
+    flux_x += dt * gravity * cell * (surface[:, :-1] - surface[:, 1:])
+    flux_x *= links_x
+    flux_y *= damping
+    flux_y += dt * gravity * cell * (surface[:-1] - surface[1:])
+    flux_y *= links_y
+    # scale the outflow so no cell drains below zero
+    outflow = np.zeros_like(depth)
+    outflow[:, :-1] += np.maximum(flux_x, 0)
+    outflow[:, 1:] -= np.minimum(flux_x, 0)
+    outflow[:-1] += np.maximum(flux_y, 0)
+    outflow[1:] -= np.minimum(flux_y, 0)
+    outflow *= dt
+    scale = np.minimum(1, depth * area / np.maximum(outflow, 1e-12))
+    flux_x *= np.where(flux_x > 0, scale[:, :-1], scale[:, 1:])
+    flux_y *= np.where(flux_y > 0, scale[:-1], scale[1:])
+    # move the water
+    moved_x = flux_x * (dt / area)
+    moved_y = flux_y * (dt / area)
+    depth[:, :-1] -= moved_x
+    depth[:, 1:] += moved_x
+    depth[:-1] -= moved_y
+    depth[1:] += moved_y
+    np.maximum(depth, 0, out=depth)
+
+
+class HeightfieldSurface(scene.Component):
+    """
+    Heightfield Surface
+    - bed: height of the floor of each cell -- pools of varying depth
+    - depth: water depth of each cell
+    - solid: cells that water can not enter -- splits the grid into basins
+
+    water flows between neighbouring open cells, so connected basins level out
+    """
+
+    def __init__(self, grid: tuple, cell: float, config: dict, bed=None, solid=None):
+        """Initialize the heightfield"""
+        super().__init__()
+        cols, rows = grid
+        self.cell = cell
+        self.gravity = config["gravity"]
+        self.damping = config["damping"]
+        self.bed = np.zeros((rows, cols)) if bed is None else np.asarray(bed, dtype=np.float64)
+        self.solid = np.zeros((rows, cols), dtype=bool) if solid is None else np.asarray(solid, dtype=bool)
+        # fill to the starting level
+        self.depth = np.maximum(config["depth"] - self.bed, 0)
+        self.depth[self.solid] = 0
+        self.flux_x = np.zeros((rows, cols - 1))
+        self.flux_y = np.zeros((rows - 1, cols))
+        # pipes across walls are closed
+        open_ = ~self.solid
+        self.links_x = (open_[:, :-1] & open_[:, 1:]).astype(np.float64)
+        self.links_y = (open_[:-1] & open_[1:]).astype(np.float64)
+        self.clock = WaterClock(config)
+        # sleeping
+        self.sleep_energy = config["sleep_energy"]
+        self.asleep = False
+
+    @property
+    def shape(self):
+        """Rows + columns of the grid"""
+        return self.depth.shape
+
+    @property
+    def surface(self):
+        """Height of the water surface in each cell"""
+        return self.bed + self.depth
+
+    def energy(self):
+        """Mean flow energy of the pipes"""
+        area = self.cell * self.cell
+        return float(
+            (np.mean(np.square(self.flux_x / area)) if self.flux_x.size else 0)
+            + (np.mean(np.square(self.flux_y / area)) if self.flux_y.size else 0)
+        )
+
+    def sleep(self):
+        """Stop simulating -- the flow is stopped"""
+        self.asleep = True
+        self.flux_x.fill(0)
+        self.flux_y.fill(0)
+
+    def wake(self):
+        """Start simulating again"""
+        self.asleep = False
+
+    def step(self, dt: float):
+        """Step the heightfield once"""
+        step_heightfield(
+            self.bed,
+            self.depth,
+            self.flux_x,
+            self.flux_y,
+            self.links_x,
+            self.links_y,
+            dt,
+            self.gravity,
+            self.cell,
+            self.damping,
+        )
+
+    def advance(self, delta: float):
+        """Run the fixed steps for `delta` seconds of frame time"""
+        if self.asleep:
+            return
+        for _ in range(self.clock.advance(delta)):
+            self.step(self.clock.dt)
+        if self.energy() < self.sleep_energy:
+            self.sleep()
+
+
+class HeightfieldWater(physics.Entity):
+    def __init__(self, width: int, height: int, config: dict = None, bed=None, solid=None):
+        """Initialize the top-down water object."""
+        super().__init__()
+        self.area = (width, height)
+        self.config = dict(HEIGHTFIELD_CONFIG, **config) if config else HEIGHTFIELD_CONFIG.copy()
+        self.splashed = set()
+        cols, rows = self.config["grid"]
+        self.cell = width / cols
+        self.surface = HeightfieldSurface(
+            (cols, rows), self.cell, self.config, bed, solid
+        )
+        self._drawn_asleep = False
+        # rendering -- the grid is shaded by depth and scaled onto the sprite
+        self._grid_sprite = SORA.make_surface(cols, rows)
+        self._grid_sprite.fill(self.config["color"])
+        self._max_alpha = self.config["color"][3]
+        # components
+        self.c_sprite = base_objects.Sprite(self.area[0], self.area[1])
+        self.sprite = self.c_sprite.sprite
+        self.c_area = base_objects.Area2D(self.area[0], self.area[1])
+        # add signal receiver
+        self.r_overlaparea = self.c_area.overlap_signal_register.add_receiver(signal.Receiver(self._on_entity_overlap))
+        self.r_exitarea = self.c_area.exit_signal_register.add_receiver(signal.Receiver(self._on_entity_exit))
+
+    def on_ready(self):
+        """Called when the object is ready."""
+        self.add_component(self.c_sprite)
+        self.add_component(base_objects.SpriteRenderer())
+        self.add_component(self.surface)
+        # add collision body
+        self.add_component(self.c_area)
+
+    def _on_entity_overlap(self, other):
+        """entity overlapping"""
+        self.surface.wake()
+        if hash(other) in self.splashed: return
+        self.splash(self.xpoint_to_location(other.position), other.velocity.length() * SORA.DELTA)
+        self.splashed.add(hash(other))
+
+    def _on_entity_exit(self, other):
+        """entity leaving"""
+        self.splashed.discard(hash(other))
+
+    def add_volume(self, volume):
+        """Add volume to the water -- spread over every open cell"""
+        open_ = ~self.surface.solid
+        self.surface.depth[open_] += volume / (np.count_nonzero(open_) * self.cell * self.cell)
+        np.maximum(self.surface.depth, 0, out=self.surface.depth)
+        self.surface.wake()
+
+    def remove_volume(self, volume):
+        """Remove volume from the water."""
+        self.add_volume(-volume)
+
+    def splash(self, location, velocity):
+        """
+        Push the water at a cell down (or pull it up) -- `velocity` is depth in pixels
+        - the water is displaced into (or out of) the open neighbours, no volume is added
+        """
+        col, row = location
+        surface = self.surface
+        rows, cols = surface.shape
+        if not (0 <= row < rows and 0 <= col < cols) or surface.solid[row, col]:
+            return
+        near = np.array(((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)))
+        near = near[(near[:, 0] >= 0) & (near[:, 0] < rows) & (near[:, 1] >= 0) & (near[:, 1] < cols)]
+        near = near[~surface.solid[near[:, 0], near[:, 1]]]
+        if not len(near):
+            return
+        rs, cs = near.T
+        # limited by the water there is to move
+        if velocity > 0:
+            moved = min(velocity, surface.depth[row, col])
+        else:
+            moved = -min(-velocity, len(near) * surface.depth[rs, cs].min())
+        surface.depth[row, col] -= moved
+        surface.depth[rs, cs] += moved / len(near)
+        surface.wake()
+
+    def get_water_level_at(self, location):
+        """Get the water level at a cell"""
+        col, row = location
+        return float(self.surface.bed[row, col] + self.surface.depth[row, col])
+
+    def xpoint_to_location(self, point):
+        """Convert a world point to a cell."""
+        return (
+            int((point[0] - self.position.x + self.c_sprite.hwidth) / self.cell),
+            int((point[1] - self.position.y + self.c_sprite.hheight) / self.cell),
         )
+
+    # === update
+    def update(self):
+        self.surface.advance(SORA.DELTA)
+        # calm water keeps its last sprite
+        if self.surface.asleep and self._drawn_asleep:
+            return
+        self._drawn_asleep = self.surface.asleep
+        self.render()
+
+    def render(self):
+        """Shade each cell by its depth"""
+        depth = self.surface.depth
+        alpha = pygame.surfarray.pixels_alpha(self._grid_sprite)
+        alpha[:] = np.minimum(
+            depth.T * (self._max_alpha / (2 * self.config["depth"])), 255
+        ).astype(np.uint8)
+        del alpha
+        pygame.transform.scale(self._grid_sprite, self.area, self.sprite)
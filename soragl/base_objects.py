@@ -4,6 +4,7 @@ from soragl import scene, physics, mgl, animation, smath, signal
 import random
 import math
 import glm
+import numpy as np
 
 from pygame import Rect as pgRect
 from pygame import math as pgmath
@@ -201,13 +202,27 @@ class Area2D(scene.Component):
 
 
 class Area2DAspect(scene.Aspect):
+    """
+    Area2D Aspect
+    - sort and sweep broadphase on the x axis between areas + moving bodies
+    - the endpoint list is kept between frames, so re-sorting it is near linear
+    - enter / overlap / exit signals come from the pair set difference between frames
+    """
+
+    AREA = 0
+    BODY = 1
+
     def __init__(self):
         super().__init__(Area2D)
         # ensures runs after collsion2D aspect
         # since we want to use updated positions of entities in world -- for area2D detection
         self.priority = 18
         self.a_collision2D = None
-        self.overlapped = set()
+        # (area hash, body hash): (area, body)
+        self.overlapped = {}
+        # private
+        self._endpoints = []  # [x, is_min, hash, role, entity]
+        self._tracked = set()  # (hash, role)
 
     def on_add(self):
         """On add"""
@@ -215,48 +230,107 @@ class Area2DAspect(scene.Aspect):
         self.a_collision2D = self._world.get_aspect(Collision2DAspect, Collision2DRendererAspectDebug)
         if not self.a_collision2D:
             raise NotImplementedError("Please add the Collision2DAspect before the Area2DAspect")
-    
+
+    def update_endpoints(self):
+        """Track areas + moving bodies and refresh their x endpoints"""
+        current = {(hash(e), self.AREA): e for e in self.iterate_entities()}
+        current.update(
+            ((hash(e), self.BODY), e)
+            for e in self.a_collision2D.iterate_entities()
+            if not e.static
+        )
+        if current.keys() != self._tracked:
+            self._endpoints = [ep for ep in self._endpoints if (ep[2], ep[3]) in current]
+            for key, role in current.keys() - self._tracked:
+                entity = current[(key, role)]
+                self._endpoints.append([0, False, key, role, entity])
+                self._endpoints.append([0, True, key, role, entity])
+            self._tracked = set(current.keys())
+        for ep in self._endpoints:
+            ep[0] = ep[4].rect.left if ep[1] else ep[4].rect.right
+        # max before min on ties -- touching rects do not overlap
+        self._endpoints.sort()
+
+    def sweep(self) -> dict:
+        """Find the overlapping area + body pairs"""
+        active = ({}, {})
+        pairs = {}
+        for x, is_min, key, role, entity in self._endpoints:
+            if not is_min:
+                active[role].pop(key, None)
+                continue
+            rect = entity.rect
+            if rect.w <= 0:
+                continue
+            for other_key, other in active[1 - role].items():
+                if other_key == key or not rect.colliderect(other.rect):
+                    continue
+                if role == self.AREA:
+                    pairs[(key, other_key)] = (entity, other)
+                else:
+                    pairs[(other_key, key)] = (other, entity)
+            active[role][key] = entity
+        return pairs
+
     def handle(self):
         """Handle area2Ds"""
-        for entity in self.iterate_entities():
-            # check for collision with each of the active collision2D components
-            for other in self.a_collision2D.iterate_entities():
-                # rect collision between entities
-                if other.static: continue
-                if other.rect.colliderect(entity.rect):
-                    # raise a signal?
-                    # how to retrieve the component object faster?
-                    if id(other) in self.overlapped:
-                        entity.get_component(Area2D).overlap_signal_register.emit_signal(other)
-                    else:
-                        entity.get_component(Area2D).enter_signal_register.emit_signal(other)
-                        self.overlapped.add(id(other))
-                    # print(f"signal: {SORA.ENGINE_UPTIME:.2f}", entity)
-                elif id(other) in self.overlapped:
-                    entity.get_component(Area2D).exit_signal_register.emit_signal(other)
-                    self.overlapped.remove(id(other))
-
-
-
-# TODO:
-# add in - circle + polygon
+        self.update_endpoints()
+        pairs = self.sweep()
+        previous = self.overlapped
+        # how to retrieve the component object faster?
+        for pair, (entity, other) in pairs.items():
+            if pair in previous:
+                entity.get_component(Area2D).overlap_signal_register.emit_signal(other)
+            else:
+                entity.get_component(Area2D).enter_signal_register.emit_signal(other)
+        for pair in previous.keys() - pairs.keys():
+            entity, other = previous[pair]
+            entity.get_component(Area2D).exit_signal_register.emit_signal(other)
+        self.overlapped = pairs
+
 
 # ------------------------------ #
 # collision2d
 
 
 class Collision2DComponent(scene.Component):
-    def __init__(self, offset: list = None):
+    """
+    Collision2D Component
+    - collides as the entity's rect unless given a physics shape (circle, polygon, capsule)
+    - shapes follow the entity's position + offset
+    - `continuous` entities sweep their bounds instead of stepping, fast ones can't tunnel
+    """
+
+    def __init__(
+        self, offset: list = None, shape: physics.Shape = None, continuous: bool = False
+    ):
         super().__init__()
         # private
         self._offset = pgmath.Vector2(offset) if offset else pgmath.Vector2(0, 0)
         self._rect = None
+        self.shape = shape
+        self.continuous = continuous
         self.signal_register = signal.SignalRegister("Collision2D")
 
     def on_add(self):
         """On add"""
         self._rect = self._entity.rect
         self._rect.center = self._entity.position.xy
+        if not self.shape:
+            self.shape = physics.RectShape(self._rect)
+        if self._entity.world.spatial_hash is not None:
+            self._entity.world.spatial_hash.update(self._entity)
+
+    def on_remove(self):
+        """On remove"""
+        if self._entity.world.spatial_hash is not None:
+            self._entity.world.spatial_hash.remove(self._entity)
+
+    def get_shape(self) -> physics.Shape:
+        """Get the shape moved to where the entity is"""
+        if self.shape.KIND != physics.RectShape.KIND:
+            self.shape.set_transform(self._offset + self._entity.position)
+        return self.shape
 
     def get_relative_position(self):
         """Get the relative position"""
@@ -285,14 +359,22 @@ class Collision2DComponent(scene.Component):
 
 
 class Collision2DAspect(scene.Aspect):
-    def __init__(self):
+    """
+    Collision2D Aspect
+    - moves entities + resolves their collisions with statics
+    - statics are found through the world's spatial hash, kept current as entities move
+    """
+
+    def __init__(self, cell_size: int = 64):
         super().__init__(Collision2DComponent)
         self.priority = 19
+        self.cell_size = cell_size
         # private
         self._handler_aspect = (
             None  # to be set after in 'on_add' of the collision2dhandleraspect
         )
         self._tile_map = None
+        self._grid = None
 
     def on_add(self):
         """On add"""
@@ -300,9 +382,108 @@ class Collision2DAspect(scene.Aspect):
         if not self._tile_map:
             self._tile_map = self._world.get_aspect(TileMapDebug)
         # if not exist then oh well lmao
+        if self._world.spatial_hash is None:
+            self._world.spatial_hash = physics.SpatialHash(self.cell_size)
+        self._grid = self._world.spatial_hash
+        if self._targets[0] in self._world._components:
+            for entity in self.iterate_entities():
+                self._grid.update(entity)
+
+    def handle_shape_movement(self, entity, component: Collision2DComponent):
+        """
+        Move an entity with a non rect shape
+        - move, then push out of every static it overlaps by the minimum translation vector
+        - velocity into the contact is removed
+        """
+        entity.position += entity.velocity * SORA.DELTA
+        entity.rect.center = entity.position.xy
+        self.resolve_shape_overlaps(entity, component)
+
+    def resolve_shape_overlaps(self, entity, component: Collision2DComponent):
+        """Push a shaped entity out of every static it overlaps + drop the velocity into the contact"""
+        for col in self.iterate_collisions(entity.rect):
+            other = (
+                col.get_component(Collision2DComponent)
+                if hasattr(col, "get_component")
+                else None
+            )
+            other = other.get_shape() if other else physics.RectShape(col.rect)
+            mtv = physics.collide(component.get_shape(), other)
+            if mtv is None:
+                continue
+            entity.position += mtv
+            entity.rect.center = entity.position.xy
+            normal = mtv.normalize()
+            into = entity.velocity.dot(normal)
+            if into < 0:
+                entity.velocity -= normal * into
+
+    def get_bounds(self, entity, component: Collision2DComponent) -> list:
+        """Float (left, top, right, bottom) of an entity -- rects are rounded, positions aren't"""
+        if component.shape.KIND != physics.RectShape.KIND:
+            return list(component.get_shape().bounds)
+        x, y = entity.position.x, entity.position.y
+        hw, hh = entity.rect.w / 2, entity.rect.h / 2
+        return [x - hw, y - hh, x + hw, y + hh]
+
+    def sweep(self, bounds: list, axis: int, delta: float) -> float:
+        """
+        Swept AABB along one axis (0 = x, 1 = y)
+        - returns how far `bounds` can move by `delta` before touching a static
+        - statics already overlapping the bounds are left to the overlap resolution
+        """
+        lo, hi = bounds[axis], bounds[axis + 2]
+        # the other axis -- only statics in this lane can be hit
+        olo, ohi = bounds[1 - axis], bounds[3 - axis]
+        start, end = min(lo, lo + delta), max(hi, hi + delta)
+        start, olo_ = math.floor(start), math.floor(olo)
+        length, width = math.ceil(end) - start + 1, math.ceil(ohi) - olo_
+        if axis == 0:
+            swept = pgRect(start, olo_, length, width)
+        else:
+            swept = pgRect(olo_, start, width, length)
+        travel = delta
+        for col in self.iterate_collisions(swept):
+            r = col.rect
+            clo, chi = (r.left, r.right) if axis == 0 else (r.top, r.bottom)
+            oclo, ochi = (r.top, r.bottom) if axis == 0 else (r.left, r.right)
+            if not (olo < ochi and oclo < ohi):
+                continue
+            if delta > 0 and hi <= clo:
+                travel = min(travel, clo - hi)
+            elif delta < 0 and chi <= lo:
+                travel = max(travel, chi - lo)
+        return travel
+
+    def handle_continuous_movement(self, entity, component: Collision2DComponent):
+        """
+        Move an entity with one swept AABB per axis
+        - the entity stops at the earliest contact + loses its velocity on that axis
+        - shaped entities are pushed out of anything they still overlap afterwards
+        """
+        for axis in (0, 1):
+            delta = entity.velocity[axis] * SORA.DELTA
+            if not delta:
+                continue
+            travel = self.sweep(self.get_bounds(entity, component), axis, delta)
+            entity.position[axis] += travel
+            if travel != delta:
+                entity.velocity[axis] = 0
+            entity.rect.center = entity.position.xy
+        if component.shape.KIND != physics.RectShape.KIND:
+            self.resolve_shape_overlaps(entity, component)
 
     def handle_movement(self, entity):
         """Handle the movement of the entity"""
+        component = entity.get_component(Collision2DComponent)
+        if component.continuous:
+            self.handle_continuous_movement(entity, component)
+            self.update_chunk(entity)
+            return
+        if component.shape.KIND != physics.RectShape.KIND:
+            self.handle_shape_movement(entity, component)
+            self.update_chunk(entity)
+            return
         """
         move in x
         move in y
@@ -338,8 +519,10 @@ class Collision2DAspect(scene.Aspect):
             entity.rect.center = entity.position.xy
         # update rect once more
         entity.rect.center = entity.position.xy
+        self.update_chunk(entity)
 
-        # update chunk position -- if moved to new chunk
+    def update_chunk(self, entity):
+        """Update chunk position -- if moved to new chunk"""
         nchunk = [
             int(entity.position.x) // self._world._options["chunkpixw"],
             int(entity.position.y) // self._world._options["chunkpixh"],
@@ -350,7 +533,7 @@ class Collision2DAspect(scene.Aspect):
 
     def iterate_collisions(self, rect):
         """Detect all collisions that occur with a certain rect"""
-        for entity in self.iterate_entities():
+        for entity in self._grid.query(rect):
             if id(entity.rect) == id(rect) or not entity.static:
                 continue
             # check collision
@@ -361,13 +544,28 @@ class Collision2DAspect(scene.Aspect):
             return
         for item in self._tile_map.iterate_active_tiles():
             # print(item)
-            if item.rect.colliderect(entity.rect):
+            if item.rect.colliderect(rect):
                 yield item
 
+    def step_entity(self, entity):
+        """
+        Move an entity + keep it current in the spatial hash
+        - resting statics are only re-synced (rect, chunk + cells) if their position was set by hand
+        """
+        if not entity.static or entity.velocity.x or entity.velocity.y:
+            self.handle_movement(entity)
+            self._grid.update(entity)
+            return
+        center = entity.rect.center
+        entity.rect.center = entity.position.xy
+        if entity.rect.center != center:
+            self.update_chunk(entity)
+            self._grid.update(entity)
+
     def handle(self):
         """Handle Collisions for Collision2D Components"""
         for entity in self.iterate_entities():
-            self.handle_movement(entity)
+            self.step_entity(entity)
 
 
 class Collision2DRendererAspectDebug(Collision2DAspect):
@@ -378,7 +576,7 @@ class Collision2DRendererAspectDebug(Collision2DAspect):
         """Render the collision areas"""
         # print(len(list(self.iterate_entities())))
         for entity in self.iterate_entities():
-            self.handle_movement(entity)
+            self.step_entity(entity)
             # render debug rect etc
             # print(entity.rect)
             pgdraw.rect(SORA.DEBUGBUFFER, (255, 0, 0), entity.rect, 1)
@@ -583,12 +781,7 @@ def create_square_particle(parent, **kwargs):
         kwargs["angv"] if "angv" in kwargs else (random.random() - 0.5) * 100,
         list(kwargs["color"]) if "color" in kwargs else [0, 0, 255],
         kwargs["life"] if "life" in kwargs else 1.0,
-        (
-            physics.World2D.RIGHT * r,
-            physics.World2D.UP * r,
-            physics.World2D.LEFT * r,
-            physics.World2D.DOWN * r,
-        ),  # points
+        r,  # radius
         parent.get_new_particle_id(),
     ]
 
@@ -609,11 +802,15 @@ def update_square_particle(parent, particle):
     particle[0] += particle[1] * SORA.DELTA
     particle[2] += particle[3] * SORA.DELTA
     # render -- square (that rotates)
-    points = [i.rotate(particle[2]) + particle[0] for i in particle[6]]
-    pgdraw.polygon(SORA.FRAMEBUFFER, particle[4], points, 1)
+    parent.stamp("square", particle[6], particle[2], particle[4], particle[0])
 
 
 # register
+physics.StampCache.register_shape(
+    "square",
+    (physics.World2D.RIGHT, physics.World2D.UP, physics.World2D.LEFT, physics.World2D.DOWN),
+    90,
+)
 physics.ParticleHandler.register_create_function("square", create_square_particle)
 physics.ParticleHandler.register_update_function("square", update_square_particle)
 
@@ -635,11 +832,7 @@ def create_triangle_particle(parent, **kwargs):
         kwargs["angv"] if "angv" in kwargs else (random.random() - 0.5) * 1000,
         list(kwargs["color"]) if "color" in kwargs else [0, 0, 255],
         kwargs["life"] if "life" in kwargs else 1.0,
-        (
-            physics.RIGHT * r,
-            physics.RIGHT.rotate(120) * r,
-            physics.RIGHT.rotate(240) * r,
-        ),  # points
+        r,  # radius
         parent.get_new_particle_id(),
     ]
 
@@ -659,12 +852,16 @@ def update_triangle_particle(parent, particle):
     # just spin + move in random direction
     particle[0] += particle[1] * SORA.DELTA
     particle[2] += particle[3] * SORA.DELTA
-    # render -- square (that rotates)
-    points = [i.rotate(particle[2]) + particle[0] for i in particle[6]]
-    pgdraw.polygon(SORA.FRAMEBUFFER, particle[4], points, 1)
+    # render -- triangle (that rotates)
+    parent.stamp("triangle", particle[6], particle[2], particle[4], particle[0])
 
 
 # register
+physics.StampCache.register_shape(
+    "triangle",
+    (physics.World2D.RIGHT, physics.World2D.RIGHT.rotate(120), physics.World2D.RIGHT.rotate(240)),
+    120,
+)
 physics.ParticleHandler.register_create_function("triangle", create_triangle_particle)
 physics.ParticleHandler.register_update_function("triangle", update_triangle_particle)
 
@@ -705,7 +902,7 @@ def create_custom_particle(parent, **kwargs):
         kwargs["angv"] if "angv" in kwargs else (random.random() - 0.5) * 1000,
         list(kwargs["color"]) if "color" in kwargs else [255, 192, 203],
         kwargs["life"] if "life" in kwargs else 1.0,
-        tuple([_ * r for _ in __custom_shape]),  # points
+        r,  # radius
         parent.get_new_particle_id(),
     ]
 
@@ -725,15 +922,108 @@ def update_custom_particle(parent, particle):
     # just spin + move in random direction
     particle[0] += particle[1] * SORA.DELTA
     particle[2] += particle[3] * SORA.DELTA
-    # render -- square (that rotates)
-    points = [i.rotate(particle[2]) + particle[0] for i in particle[6]]
-    pgdraw.polygon(SORA.FRAMEBUFFER, particle[4], points, 1)
+    # render -- custom (that rotates)
+    parent.stamp("custom", particle[6], particle[2], particle[4], particle[0])
 
 
 # register
+physics.StampCache.register_shape("custom", __custom_shape)
 physics.ParticleHandler.register_create_function("custom", create_custom_particle)
 physics.ParticleHandler.register_update_function("custom", update_custom_particle)
 
+# ------------------------------ #
+# array particles -- same shapes, whole batches at a time
+
+
+def _create_array_spin_particle(parent, index, kwargs, angv, color):
+    """Create spinning array particles"""
+    n = len(index)
+    parent.positions[index] = parent.position.xy
+    if "vel" in kwargs:
+        parent.velocities[index] = kwargs["vel"]
+    else:
+        parent.velocities[index] = (np.random.random((n, 2)) - 0.5) * 100
+    parent.angles[index] = 0
+    parent.spins[index] = (
+        kwargs["angv"] if "angv" in kwargs else (np.random.random(n) - 0.5) * angv
+    )
+    parent.colors[index] = kwargs["color"] if "color" in kwargs else color
+    parent.lives[index] = kwargs["life"] if "life" in kwargs else 1.0
+    parent.sizes[index] = kwargs["radius"] if "radius" in kwargs else 10
+
+
+def _update_array_spin_particle(parent, count):
+    """Spin + move array particles"""
+    live = slice(0, count)
+    parent.lives[live] -= SORA.DELTA
+    parent.positions[live] += parent.velocities[live] * SORA.DELTA
+    parent.angles[live] += parent.spins[live] * SORA.DELTA
+
+
+def _color_array_cycle(parent, count):
+    """Colour cycle used by the square + triangle particles"""
+    colors = parent.colors[:count]
+    colors[:, 0] = int(math.sin(SORA.ENGINE_UPTIME) * 127 + 127)
+    colors[:, 1] = int(math.cos(SORA.ENGINE_UPTIME) * 127 + 127)
+    colors[:, 2] = (np.sin(parent.positions[:count, 0]) * 127 + 127).astype(np.int64)
+
+
+def create_array_square_particle(parent, index, **kwargs):
+    """Create square array particles"""
+    _create_array_spin_particle(parent, index, kwargs, 100, (0, 0, 255))
+
+
+def update_array_square_particle(parent, count):
+    """Update square array particles"""
+    _color_array_cycle(parent, count)
+    _update_array_spin_particle(parent, count)
+
+
+def render_array_square_particle(parent, count):
+    """Render square array particles"""
+    return physics.array_stamp_blits(parent, count, "square")
+
+
+def create_array_triangle_particle(parent, index, **kwargs):
+    """Create triangle array particles"""
+    _create_array_spin_particle(parent, index, kwargs, 1000, (0, 0, 255))
+
+
+def render_array_triangle_particle(parent, count):
+    """Render triangle array particles"""
+    return physics.array_stamp_blits(parent, count, "triangle")
+
+
+def create_array_custom_particle(parent, index, **kwargs):
+    """Create custom array particles"""
+    _create_array_spin_particle(parent, index, kwargs, 1000, (255, 192, 203))
+
+
+def update_array_custom_particle(parent, count):
+    """Update custom array particles"""
+    colors, positions = parent.colors[:count], parent.positions[:count]
+    colors[:, 0] = 255 - np.abs((np.sin(positions[:, 1]) * 100).astype(np.int64))
+    colors[:, 1] = abs(int(math.cos(SORA.ENGINE_UPTIME) * 129))
+    colors[:, 2] = 200 - np.abs((np.sin(positions[:, 0]) * 40).astype(np.int64))
+    _update_array_spin_particle(parent, count)
+
+
+def render_array_custom_particle(parent, count):
+    """Render custom array particles"""
+    return physics.array_stamp_blits(parent, count, "custom")
+
+
+# register
+physics.ArrayParticleHandler.register_create_function("square", create_array_square_particle)
+physics.ArrayParticleHandler.register_update_function("square", update_array_square_particle)
+physics.ArrayParticleHandler.register_render_function("square", render_array_square_particle)
+physics.ArrayParticleHandler.register_create_function("triangle", create_array_triangle_particle)
+physics.ArrayParticleHandler.register_update_function("triangle", update_array_square_particle)
+physics.ArrayParticleHandler.register_render_function("triangle", render_array_triangle_particle)
+physics.ArrayParticleHandler.register_create_function("custom", create_array_custom_particle)
+physics.ArrayParticleHandler.register_update_function("custom", update_array_custom_particle)
+physics.ArrayParticleHandler.register_render_function("custom", render_array_custom_particle)
+
 
 # ------------------------------------------------------------ #
 # 3D / 2D cameras!
@@ -3,9 +3,13 @@ print("Activating physics.py")
 import soragl as SORA
 import random
 import math
+import numpy as np
+from itertools import chain
+from collections import OrderedDict
 
 from soragl import scene
 from pygame import Rect as pRect
+from pygame import Surface as pSurface
 from pygame import math as pgmath
 from pygame import draw as pgdraw
 
@@ -39,28 +43,13 @@ class World3D:
 # ------------------------------------------------------------ #
 
 
-class Entity:
-    ENTITY_COUNT = 0
+class EntityBase:
+    """
+    Behaviour shared by every entity
+    - subclasses set up the attributes (world, components, position, rect, ...)
+    """
 
-    def __init__(self):
-        # defined after register
-        self.world = None
-        self.scene = None
-        self.handler = None
-
-        # private
-        self._components = {}
-        self._alive = True
-        Entity.ENTITY_COUNT += 1
-        self._entity_id = Entity.ENTITY_COUNT
-        self._projected_position = pgmath.Vector2()
-
-        # public
-        self.c_chunk = [0, 0]
-        self.position = pgmath.Vector2()
-        self.velocity = pgmath.Vector2()
-        self.rect = pRect(0, 0, 0, 0)
-        self.static = False
+    __slots__ = ()
 
     # whenever components are added -- the world must be queried --> so that cache can be updated
     def on_ready(self):
@@ -80,8 +69,8 @@ class Entity:
         return component
 
     def remove_component(self, component):
-        """Remove a component from the entity"""
-        if component in self._components:
+        """Remove a component from the entity -- the component or its class"""
+        if hash(component) in self._components:
             self.world.remove_component(self, component)
 
     def get_component_from_hash(self, comp_class_hash: int):
@@ -133,6 +122,468 @@ class Entity:
         return self._entity_id
 
 
+class Entity(EntityBase):
+    ENTITY_COUNT = 0
+
+    def __init__(self):
+        # defined after register
+        self.world = None
+        self.scene = None
+        self.handler = None
+
+        # private
+        self._components = {}
+        self._alive = True
+        Entity.ENTITY_COUNT += 1
+        self._entity_id = Entity.ENTITY_COUNT
+        self._projected_position = pgmath.Vector2()
+
+        # public
+        self.c_chunk = [0, 0]
+        self.position = pgmath.Vector2()
+        self.velocity = pgmath.Vector2()
+        self.rect = pRect(0, 0, 0, 0)
+        self.static = False
+
+
+# ------------------------------------------------------------ #
+# compact entities
+"""
+Opt in compact entities
+- `__slots__` only -- no instance dict, no Vector2 / Rect objects + no global counter
+- position, velocity + rect live in arrays owned by the world (world.transforms)
+- the entity gets views into those arrays, they behave like Vector2 / Rect
+- Kinematic2DAspect moves every kinematic compact entity of a world in one go
+
+subclasses should declare `__slots__` as well, or they get a dict back
+"""
+# ------------------------------------------------------------ #
+
+
+class TransformStore:
+    """
+    Contiguous transform arrays
+    - positions + velocities are (n, 2) floats, rects are (n, 4) ints like pygame Rects
+    - chunks is the chunk each slot is registered in, entities are the owners' hashes
+    - arrays grow by doubling, views always go through the store so they stay valid
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.rects = np.zeros((capacity, 4), dtype=np.int64)
+        self.chunks = np.zeros((capacity, 2), dtype=np.int64)
+        self.kinematic = np.zeros(capacity, dtype=bool)
+        self.entities = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.entities) - len(self._free)
+
+    def grow(self):
+        """Double the capacity"""
+        capacity = len(self.entities)
+        for name in ("positions", "velocities", "rects", "chunks", "kinematic"):
+            array = getattr(self, name)
+            bigger = np.zeros((capacity * 2,) + array.shape[1:], dtype=array.dtype)
+            bigger[:capacity] = array
+            setattr(self, name, bigger)
+        self.entities.extend([None] * capacity)
+        self._free = list(range(capacity * 2 - 1, capacity - 1, -1)) + self._free
+
+    def allocate(self, entity) -> int:
+        """Get a slot for an entity -- or an entity's hash"""
+        if not self._free:
+            self.grow()
+        slot = self._free.pop()
+        self.entities[slot] = hash(entity)
+        return slot
+
+    def release(self, slot: int):
+        """Give a slot back"""
+        self.entities[slot] = None
+        self.positions[slot] = self.velocities[slot] = 0
+        self.rects[slot] = self.chunks[slot] = 0
+        self.kinematic[slot] = False
+        self._free.append(slot)
+
+    def move(self, slot: int, other: "TransformStore") -> int:
+        """Move a slot into another store -- returns the new slot"""
+        new = other.allocate(self.entities[slot])
+        other.positions[new] = self.positions[slot]
+        other.velocities[new] = self.velocities[slot]
+        other.rects[new] = self.rects[slot]
+        other.kinematic[new] = self.kinematic[slot]
+        self.release(slot)
+        return new
+
+    def integrate(self, delta: float):
+        """Move every kinematic slot by its velocity + recenter its rect"""
+        moving = np.flatnonzero(self.kinematic)
+        if not len(moving):
+            return moving
+        self.positions[moving] += self.velocities[moving] * delta
+        rects = self.rects[moving]
+        rects[:, :2] = np.rint(self.positions[moving]) - rects[:, 2:] // 2
+        self.rects[moving] = rects
+        return moving
+
+
+class VectorView:
+    """
+    Vector2 like view of a row in a TransformStore
+    - arithmetic returns plain pygame Vector2s, in place operators write back into the store
+    """
+
+    __slots__ = ("_store", "_field", "_slot")
+
+    def __init__(self, store: TransformStore, field: str, slot: int):
+        self._store = store
+        self._field = field
+        self._slot = slot
+
+    @property
+    def _row(self):
+        return getattr(self._store, self._field)[self._slot]
+
+    @property
+    def x(self):
+        return getattr(self._store, self._field)[self._slot, 0].item()
+
+    @x.setter
+    def x(self, value):
+        getattr(self._store, self._field)[self._slot, 0] = value
+
+    @property
+    def y(self):
+        return getattr(self._store, self._field)[self._slot, 1].item()
+
+    @y.setter
+    def y(self, value):
+        getattr(self._store, self._field)[self._slot, 1] = value
+
+    @property
+    def xy(self):
+        return pgmath.Vector2(self._row.tolist())
+
+    @xy.setter
+    def xy(self, value):
+        self._row[:] = (value[0], value[1])
+
+    def copy(self):
+        return self.xy
+
+    def length(self):
+        return math.hypot(*self._row.tolist())
+
+    def dot(self, o):
+        return self.xy.dot(o)
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, i):
+        return self._row[i].item()
+
+    def __setitem__(self, i, value):
+        self._row[i] = value
+
+    def __iter__(self):
+        return iter(self._row.tolist())
+
+    def __add__(self, o):
+        return self.xy + o
+
+    def __radd__(self, o):
+        return self.xy + o
+
+    def __sub__(self, o):
+        return self.xy - o
+
+    def __rsub__(self, o):
+        return pgmath.Vector2(o) - self.xy
+
+    def __mul__(self, o):
+        return self.xy * o
+
+    def __rmul__(self, o):
+        return self.xy * o
+
+    def __neg__(self):
+        return -self.xy
+
+    def __iadd__(self, o):
+        self._row[:] += (o[0], o[1])
+        return self
+
+    def __isub__(self, o):
+        self._row[:] -= (o[0], o[1])
+        return self
+
+    def __imul__(self, o):
+        self._row[:] *= o
+        return self
+
+    def __eq__(self, o):
+        return self.xy == o
+
+    def __repr__(self):
+        return f"VectorView{self._row.tolist()}"
+
+
+class RectView:
+    """
+    pygame Rect like view of a row in a TransformStore
+    - can be passed anywhere pygame takes a rect (it is a sequence of 4)
+    """
+
+    __slots__ = ("_store", "_slot")
+
+    def __init__(self, store: TransformStore, slot: int):
+        self._store = store
+        self._slot = slot
+
+    def _get(self, i):
+        return int(self._store.rects[self._slot, i])
+
+    def _set(self, i, value):
+        self._store.rects[self._slot, i] = round(value)
+
+    x = left = property(lambda self: self._get(0), lambda self, v: self._set(0, v))
+    y = top = property(lambda self: self._get(1), lambda self, v: self._set(1, v))
+    w = width = property(lambda self: self._get(2), lambda self, v: self._set(2, v))
+    h = height = property(lambda self: self._get(3), lambda self, v: self._set(3, v))
+
+    @property
+    def right(self):
+        return self._get(0) + self._get(2)
+
+    @right.setter
+    def right(self, value):
+        self._set(0, value - self._get(2))
+
+    @property
+    def bottom(self):
+        return self._get(1) + self._get(3)
+
+    @bottom.setter
+    def bottom(self, value):
+        self._set(1, value - self._get(3))
+
+    @property
+    def centerx(self):
+        return self._get(0) + self._get(2) // 2
+
+    @centerx.setter
+    def centerx(self, value):
+        self._set(0, round(value) - self._get(2) // 2)
+
+    @property
+    def centery(self):
+        return self._get(1) + self._get(3) // 2
+
+    @centery.setter
+    def centery(self, value):
+        self._set(1, round(value) - self._get(3) // 2)
+
+    @property
+    def center(self):
+        return (self.centerx, self.centery)
+
+    @center.setter
+    def center(self, value):
+        self.centerx, self.centery = value[0], value[1]
+
+    @property
+    def topleft(self):
+        return (self._get(0), self._get(1))
+
+    @topleft.setter
+    def topleft(self, value):
+        self._set(0, value[0])
+        self._set(1, value[1])
+
+    @property
+    def size(self):
+        return (self._get(2), self._get(3))
+
+    @size.setter
+    def size(self, value):
+        self._set(2, value[0])
+        self._set(3, value[1])
+
+    def copy(self):
+        return pRect(self._store.rects[self._slot].tolist())
+
+    def colliderect(self, other) -> bool:
+        return self.copy().colliderect(other)
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, i):
+        return self._store.rects[self._slot].tolist()[i]
+
+    def __iter__(self):
+        return iter(self._store.rects[self._slot].tolist())
+
+    def __repr__(self):
+        return f"RectView{self._store.rects[self._slot].tolist()}"
+
+
+class CompactEntity(EntityBase):
+    """
+    Entity with `__slots__` + array backed transforms
+    - transforms start in a shared store + move into `world.transforms` when added to a world
+    - views are made on access, the entity itself only keeps its store + slot
+    """
+
+    # used until the entity joins a world
+    DETACHED = TransformStore()
+
+    __slots__ = (
+        "_world",
+        "scene",
+        "handler",
+        "_components",
+        "_alive",
+        "_store",
+        "_slot",
+        "static",
+    )
+
+    def __init__(self):
+        self._store = CompactEntity.DETACHED
+        self._slot = self._store.allocate(self)
+        # defined after register
+        self._world = None
+        self.scene = None
+        self.handler = None
+        # private
+        self._components = {}
+        self._alive = True
+        # public
+        self.static = False
+
+    def __del__(self):
+        self._store.release(self._slot)
+
+    def __hash__(self):
+        """Compact entities hash by identity -- no global counter"""
+        return id(self)
+
+    @property
+    def world(self):
+        return self._world
+
+    @world.setter
+    def world(self, world):
+        """Joining a world moves the transforms into the world's arrays"""
+        self._world = world
+        if world is None:
+            return
+        if world.transforms is None:
+            world.transforms = TransformStore()
+        if self._store is not world.transforms:
+            self._slot = self._store.move(self._slot, world.transforms)
+            self._store = world.transforms
+            # the chunk world.add_entity puts the entity in
+            rect = self.rect
+            self._store.chunks[self._slot] = (
+                rect.centerx // world._options["chunkpixw"],
+                rect.centery // world._options["chunkpixh"],
+            )
+
+    @property
+    def slot(self) -> int:
+        return self._slot
+
+    @property
+    def position(self):
+        return VectorView(self._store, "positions", self._slot)
+
+    @position.setter
+    def position(self, value):
+        self._store.positions[self._slot] = (value[0], value[1])
+
+    @property
+    def velocity(self):
+        return VectorView(self._store, "velocities", self._slot)
+
+    @velocity.setter
+    def velocity(self, value):
+        self._store.velocities[self._slot] = (value[0], value[1])
+
+    @property
+    def rect(self):
+        return RectView(self._store, self._slot)
+
+    @rect.setter
+    def rect(self, value):
+        self._store.rects[self._slot] = tuple(value)
+
+    @property
+    def c_chunk(self):
+        return VectorView(self._store, "chunks", self._slot)
+
+
+class Kinematic2DComponent(scene.Component):
+    """Marks a compact entity to be moved by Kinematic2DAspect"""
+
+    def __init__(self):
+        super().__init__()
+
+    def on_add(self):
+        if not isinstance(self._entity, CompactEntity):
+            raise TypeError(
+                f"Kinematic2DComponent needs a CompactEntity, not {type(self._entity).__name__}"
+            )
+        self._entity._store.kinematic[self._entity.slot] = True
+
+    def on_remove(self):
+        self._entity._store.kinematic[self._entity.slot] = False
+
+
+class Kinematic2DAspect(scene.Aspect):
+    """
+    Kinematic2D Aspect
+    - moves every kinematic compact entity by its velocity in one vectorized step
+    - no collisions, use Collision2DAspect for those
+    """
+
+    def __init__(self):
+        super().__init__(Kinematic2DComponent)
+        self.priority = 19
+
+    def handle(self):
+        """Move the entities + update their chunks"""
+        store = self._world.transforms
+        if store is None:
+            return
+        moving = store.integrate(SORA.DELTA)
+        if not len(moving):
+            return
+        # entities that moved into a new chunk
+        chunks = store.positions[moving].astype(np.int64) // (
+            self._world._options["chunkpixw"],
+            self._world._options["chunkpixh"],
+        )
+        changed = np.flatnonzero(np.any(chunks != store.chunks[moving], axis=1))
+        for i in changed.tolist():
+            slot = int(moving[i])
+            entity = self._world._scene.get_entity(store.entities[slot])
+            if entity is None:
+                # removed from the scene without its component -- stop moving it
+                store.kinematic[slot] = False
+                continue
+            self._world.update_entity_chunk(
+                entity,
+                store.chunks[slot].tolist(),
+                chunks[i].tolist(),
+            )
+            store.chunks[slot] = chunks[i]
+
+
 # ------------------------------------------------------------ #
 # SAT - check if colliding objects
 # ------------------------------------------------------------ #
@@ -141,8 +592,8 @@ class Entity:
 """
 SAT code
 - to be used when implementing box2d + movement + polygonal objects in game!
-TODO:
-- figure out how to do the above :)
+- shapes cache their axes, overlaps are rejected by their bounds first
+- every overlap reports the minimum translation vector, not just a bool
 """
 
 
@@ -155,28 +606,775 @@ def is_separated(shape1, shape2, axis: pgmath.Vector2) -> bool:
     return max_proj1 < min_proj2 or min_proj1 > max_proj2
 
 
+class ConvexPolygon:
+    """
+    Convex polygon for SAT
+    - local vertices + edge normals (axes) are computed once, parallel edges share an axis
+    - world vertices, axes + bounds are only recomputed when the transform changes
+    """
+
+    def __init__(self, vertices, position=(0, 0), angle: float = 0):
+        self.local_vertices = np.array([tuple(v) for v in vertices], dtype=np.float64)
+        edges = self.local_vertices - np.roll(self.local_vertices, 1, axis=0)
+        axes = np.stack((-edges[:, 1], edges[:, 0]), axis=1)
+        axes /= np.linalg.norm(axes, axis=1, keepdims=True)
+        # opposite edges project the same -- keep one of each
+        unique = []
+        for axis in axes:
+            if all(abs(axis[0] * o[1] - axis[1] * o[0]) > 1e-9 for o in unique):
+                unique.append(axis)
+        self.local_axes = np.array(unique)
+        self._vertices = self._axes = self._bounds = None
+        self.set_transform(position, angle)
+
+    @property
+    def position(self):
+        return pgmath.Vector2(self._transform[:2])
+
+    @property
+    def angle(self):
+        return self._transform[2]
+
+    def set_transform(self, position, angle: float = 0):
+        """Move + rotate the polygon (angle in degrees)"""
+        self._transform = (float(position[0]), float(position[1]), angle)
+        self._dirty = True
+
+    def _update(self):
+        """Recompute the world space data"""
+        self._dirty = False
+        transform = self._transform
+        if self.angle:
+            c, s = math.cos(math.radians(self.angle)), math.sin(math.radians(self.angle))
+            rotation = np.array(((c, s), (-s, c)))
+            self._vertices = self.local_vertices @ rotation
+            self._axes = self.local_axes @ rotation
+        else:
+            self._vertices = self.local_vertices.copy()
+            self._axes = self.local_axes
+        self._vertices += transform[:2]
+        self._bounds = (*self._vertices.min(axis=0), *self._vertices.max(axis=0))
+
+    @property
+    def vertices(self):
+        """World space vertices"""
+        if self._dirty:
+            self._update()
+        return self._vertices
+
+    @property
+    def axes(self):
+        """World space separating axes"""
+        if self._dirty:
+            self._update()
+        return self._axes
+
+    @property
+    def bounds(self):
+        """World space (left, top, right, bottom)"""
+        if self._dirty:
+            self._update()
+        return self._bounds
+
+    def get_vertices(self):
+        """World space vertices as Vector2s"""
+        return [pgmath.Vector2(v) for v in self.vertices.tolist()]
+
+
+def aabb_overlap(a, b) -> bool:
+    """Check if two (left, top, right, bottom) bounds overlap"""
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def sat(shape1: ConvexPolygon, shape2: ConvexPolygon):
+    """
+    Separating axis test
+    - returns None if the shapes are apart
+    - otherwise the minimum translation vector that moves shape1 out of shape2
+    """
+    if not aabb_overlap(shape1.bounds, shape2.bounds):
+        return None
+    axes = np.concatenate((shape1.axes, shape2.axes))
+    # every vertex on every axis in one product each
+    proj1 = axes @ shape1.vertices.T
+    proj2 = axes @ shape2.vertices.T
+    return least_overlap(
+        axes, proj1.min(axis=1), proj1.max(axis=1), proj2.min(axis=1), proj2.max(axis=1)
+    )
+
+
+def least_overlap(axes, min1, max1, min2, max2):
+    """Minimum translation vector from projection intervals on each axis -- None if any axis separates"""
+    # how far shape1 has to move back (-axis) or forward (+axis) to clear shape2
+    back = max1 - min2
+    forward = max2 - min1
+    depth = np.minimum(back, forward)
+    i = int(depth.argmin())
+    if depth[i] <= 0:
+        return None
+    sign = -1 if back[i] < forward[i] else 1
+    return pgmath.Vector2(*(axes[i] * depth[i] * sign))
+
+
+def sat_batch(shapes1: list, shapes2: list):
+    """
+    Separating axis test for many pairs at once
+    - returns a mask of the overlapping pairs + their minimum translation vectors (n, 2)
+    - vertices + axes are padded to the largest shape, repeats don't change the projections
+    """
+    n = len(shapes1)
+    hits = np.zeros(n, dtype=bool)
+    mtv = np.zeros((n, 2))
+    if not n:
+        return hits, mtv
+    b1 = np.array([s.bounds for s in shapes1])
+    b2 = np.array([s.bounds for s in shapes2])
+    candidates = np.flatnonzero(
+        (b1[:, 0] < b2[:, 2])
+        & (b2[:, 0] < b1[:, 2])
+        & (b1[:, 1] < b2[:, 3])
+        & (b2[:, 1] < b1[:, 3])
+    )
+    if not len(candidates):
+        return hits, mtv
+
+    def padded(arrays):
+        size = max(len(a) for a in arrays)
+        if all(len(a) == size for a in arrays):
+            return np.stack(arrays)
+        out = np.empty((len(arrays), size, 2))
+        for i, a in enumerate(arrays):
+            out[i, : len(a)] = a
+            out[i, len(a) :] = a[-1]
+        return out
+
+    pairs = [(shapes1[i], shapes2[i]) for i in candidates.tolist()]
+    v1 = padded([a.vertices for a, _ in pairs])
+    v2 = padded([b.vertices for _, b in pairs])
+    axes = padded([np.concatenate((a.axes, b.axes)) for a, b in pairs])
+    proj1 = np.einsum("pad,pvd->pav", axes, v1)
+    proj2 = np.einsum("pad,pvd->pav", axes, v2)
+    back = proj1.max(axis=2) - proj2.min(axis=2)
+    forward = proj2.max(axis=2) - proj1.min(axis=2)
+    depth = np.minimum(back, forward)
+    best = depth.argmin(axis=1)
+    rows = np.arange(len(pairs))
+    least = depth[rows, best]
+    sign = np.where(back[rows, best] < forward[rows, best], -1.0, 1.0)
+    hit = least > 0
+    hits[candidates] = hit
+    mtv[candidates] = axes[rows, best] * (least * sign * hit)[:, None]
+    return hits, mtv
+
+
+def as_polygon(shape) -> ConvexPolygon:
+    """
+    Get a ConvexPolygon for anything SAT can test
+    - polygons + shapes with a `polygon` are used as they are
+    - other objects with `get_vertices` keep a polygon on themselves, rebuilt only when their outline changes
+    """
+    if isinstance(shape, ConvexPolygon):
+        return shape
+    polygon = getattr(shape, "polygon", None)
+    if isinstance(polygon, ConvexPolygon):
+        return polygon
+    vertices = np.array([tuple(v) for v in shape.get_vertices()], dtype=np.float64)
+    local = vertices - vertices[0]
+    polygon = getattr(shape, "_sat_polygon", None)
+    if (
+        polygon is None
+        or polygon.local_vertices.shape != local.shape
+        or not np.allclose(polygon.local_vertices, local)
+    ):
+        polygon = ConvexPolygon(local)
+        try:
+            shape._sat_polygon = polygon
+        except AttributeError:
+            # no room for a cache (slots) -- build it every time
+            pass
+    polygon.set_transform(vertices[0])
+    return polygon
+
+
 def overlap_general(shape1_, shape2_) -> bool:
-    """Check if two objects overlap -- axis not used"""
-    shape1 = list(shape1_.get_vertices())
-    shape2 = list(shape2_.get_vertices())
-    # TODO: perhaps integrate the AABB for none AABB shapes
+    """Check if two objects overlap -- anything with `get_vertices` works, touching counts as overlapping"""
+    shape1, shape2 = as_polygon(shape1_), as_polygon(shape2_)
+    a, b = shape1.bounds, shape2.bounds
+    if a[0] > b[2] or b[0] > a[2] or a[1] > b[3] or b[1] > a[3]:
+        return False
+    axes = np.concatenate((shape1.axes, shape2.axes))
+    proj1 = axes @ shape1.vertices.T
+    proj2 = axes @ shape2.vertices.T
+    return not np.any(
+        (proj1.max(axis=1) < proj2.min(axis=1)) | (proj1.min(axis=1) > proj2.max(axis=1))
+    )
+
+
+# ------------------------------------------------------------ #
+# collision shapes
+"""
+Shapes for Collision2DComponent
+- local geometry is set up once, world bounds are cached until the transform changes
+- the narrow phase is picked per pair of shape kinds from COLLIDERS
+- every test returns the minimum translation vector that moves the first shape out of the second (or None)
+"""
+# ------------------------------------------------------------ #
+
+
+class Shape:
+    KIND = "shape"
+
+    def __init__(self):
+        self._transform = (0.0, 0.0, 0)
+        self._dirty = True
+        self._bounds = None
+
+    def set_transform(self, position, angle: float = 0):
+        """Move + rotate the shape (angle in degrees)"""
+        transform = (float(position[0]), float(position[1]), angle)
+        if transform != self._transform:
+            self._transform = transform
+            self._dirty = True
+
+    @property
+    def center(self):
+        return self._transform[:2]
+
+    @property
+    def bounds(self):
+        """World space (left, top, right, bottom)"""
+        if self._dirty:
+            self._dirty = False
+            self._update()
+        return self._bounds
+
+    def _update(self):
+        """Recompute the world space data"""
+        raise NotImplementedError
+
+
+class RectShape(Shape):
+    """Axis aligned box that follows a rect -- the default shape"""
+
+    KIND = "rect"
+
+    def __init__(self, rect):
+        super().__init__()
+        self.rect = rect
+        self._polygon = None
+
+    @property
+    def bounds(self):
+        rect = self.rect
+        return (rect.left, rect.top, rect.right, rect.bottom)
+
+    @property
+    def center(self):
+        return self.rect.center
+
+    @property
+    def polygon(self) -> ConvexPolygon:
+        """The rect as a polygon -- for tests against rotated shapes"""
+        w, h = self.rect.w / 2, self.rect.h / 2
+        if self._polygon is None or self._polygon.local_vertices[2, 0] != w or self._polygon.local_vertices[2, 1] != h:
+            self._polygon = ConvexPolygon(((-w, -h), (w, -h), (w, h), (-w, h)))
+        left, top, right, bottom = self.bounds
+        self._polygon.set_transform(((left + right) / 2, (top + bottom) / 2))
+        return self._polygon
+
+
+class CircleShape(Shape):
+    KIND = "circle"
+
+    def __init__(self, radius: float):
+        super().__init__()
+        self.radius = radius
+
+    def _update(self):
+        x, y, _ = self._transform
+        r = self.radius
+        self._bounds = (x - r, y - r, x + r, y + r)
+
+
+class PolygonShape(Shape):
+    """Convex polygon -- vertices are relative to the entity's position"""
+
+    KIND = "polygon"
+
+    def __init__(self, vertices):
+        super().__init__()
+        self._polygon = ConvexPolygon(vertices)
+
+    def _update(self):
+        self._polygon.set_transform(self._transform[:2], self._transform[2])
+        self._bounds = self._polygon.bounds
+
+    @property
+    def polygon(self) -> ConvexPolygon:
+        if self._dirty:
+            self.bounds
+        return self._polygon
+
+
+class CapsuleShape(Shape):
+    """Segment of `length` along the x axis (before rotating) with rounded ends of `radius`"""
+
+    KIND = "capsule"
+
+    def __init__(self, length: float, radius: float):
+        super().__init__()
+        self.length = length
+        self.radius = radius
+        self._ends = None
+
+    def _update(self):
+        x, y, angle = self._transform
+        half = pgmath.Vector2(self.length / 2, 0).rotate(angle)
+        self._ends = ((x - half.x, y - half.y), (x + half.x, y + half.y))
+        (ax, ay), (bx, by) = self._ends
+        r = self.radius
+        self._bounds = (min(ax, bx) - r, min(ay, by) - r, max(ax, bx) + r, max(ay, by) + r)
+
+    @property
+    def ends(self):
+        """World space end points of the segment"""
+        if self._dirty:
+            self.bounds
+        return self._ends
+
+
+def _closest_on_segment(p, a, b):
+    """Closest point to p on the segment a-b"""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length = dx * dx + dy * dy
+    if not length:
+        return a
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length))
+    return (a[0] + dx * t, a[1] + dy * t)
+
+
+def _closest_between_segments(p1, q1, p2, q2):
+    """Closest points between the segments p1-q1 + p2-q2"""
+    d1 = (q1[0] - p1[0], q1[1] - p1[1])
+    d2 = (q2[0] - p2[0], q2[1] - p2[1])
+    r = (p1[0] - p2[0], p1[1] - p2[1])
+    a = d1[0] * d1[0] + d1[1] * d1[1]
+    e = d2[0] * d2[0] + d2[1] * d2[1]
+    f = d2[0] * r[0] + d2[1] * r[1]
+    if not a and not e:
+        return p1, p2
+    if not a:
+        s, t = 0.0, max(0.0, min(1.0, f / e))
+    else:
+        c = d1[0] * r[0] + d1[1] * r[1]
+        if not e:
+            s, t = max(0.0, min(1.0, -c / a)), 0.0
+        else:
+            b = d1[0] * d2[0] + d1[1] * d2[1]
+            denom = a * e - b * b
+            s = max(0.0, min(1.0, (b * f - c * e) / denom)) if denom else 0.0
+            t = (b * s + f) / e
+            if t < 0:
+                s, t = max(0.0, min(1.0, -c / a)), 0.0
+            elif t > 1:
+                s, t = max(0.0, min(1.0, (b - c) / a)), 1.0
+    return (
+        (p1[0] + d1[0] * s, p1[1] + d1[1] * s),
+        (p2[0] + d2[0] * t, p2[1] + d2[1] * t),
+    )
+
+
+def _round_overlap(c1, r1, c2, r2):
+    """Minimum translation vector between two discs"""
+    dx, dy = c1[0] - c2[0], c1[1] - c2[1]
+    r = r1 + r2
+    d2 = dx * dx + dy * dy
+    if d2 >= r * r:
+        return None
+    if not d2:
+        return pgmath.Vector2(0, -r)
+    d = math.sqrt(d2)
+    return pgmath.Vector2(dx, dy) * ((r - d) / d)
+
+
+def collide_rect_rect(a, b):
+    """Box vs box"""
+    al, at, ar, ab = a.bounds
+    bl, bt, br, bb = b.bounds
+    left, right = ar - bl, br - al
+    up, down = ab - bt, bb - at
+    dx = -left if left < right else right
+    dy = -up if up < down else down
+    if min(left, right) <= 0 or min(up, down) <= 0:
+        return None
+    return pgmath.Vector2(dx, 0) if abs(dx) < abs(dy) else pgmath.Vector2(0, dy)
+
+
+def collide_circle_circle(a, b):
+    """Circle vs circle"""
+    return _round_overlap(a.center, a.radius, b.center, b.radius)
+
+
+def collide_circle_rect(a, b):
+    """Circle vs box -- closest point on the box"""
+    cx, cy = a.center
+    left, top, right, bottom = b.bounds
+    px, py = max(left, min(cx, right)), max(top, min(cy, bottom))
+    if (px, py) != (cx, cy):
+        return _round_overlap((cx, cy), a.radius, (px, py), 0)
+    # center inside the box -- out through the closest side
+    r = a.radius
+    exits = (
+        (cx - left, pgmath.Vector2(-(cx - left + r), 0)),
+        (right - cx, pgmath.Vector2(right - cx + r, 0)),
+        (cy - top, pgmath.Vector2(0, -(cy - top + r))),
+        (bottom - cy, pgmath.Vector2(0, bottom - cy + r)),
+    )
+    return min(exits, key=lambda e: e[0])[1]
+
+
+def collide_circle_polygon(a, b):
+    """Circle vs polygon -- polygon axes + the axis to the closest vertex"""
+    polygon = b.polygon
+    vertices = polygon.vertices
+    center = np.array(a.center)
+    closest = vertices[((vertices - center) ** 2).sum(axis=1).argmin()]
+    axis = center - closest
+    norm = math.hypot(axis[0], axis[1])
+    axes = polygon.axes if not norm else np.vstack((polygon.axes, axis / norm))
+    proj = axes @ vertices.T
+    c = axes @ center
+    return least_overlap(axes, c - a.radius, c + a.radius, proj.min(axis=1), proj.max(axis=1))
+
+
+def collide_polygon_polygon(a, b):
+    """Polygon vs polygon (or box)"""
+    return sat(a.polygon, b.polygon)
+
+
+def collide_capsule_circle(a, b):
+    """Capsule vs circle -- closest point on the segment"""
+    p, q = a.ends
+    return _round_overlap(_closest_on_segment(b.center, p, q), a.radius, b.center, b.radius)
+
+
+def collide_capsule_capsule(a, b):
+    """Capsule vs capsule -- closest points between the segments"""
+    c1, c2 = _closest_between_segments(*a.ends, *b.ends)
+    mtv = _round_overlap(c1, a.radius, c2, b.radius)
+    if mtv is None or math.dist(c1, c2) > 1e-6:
+        return mtv
+    # the segments cross -- find the shallowest way out along their normals + directions
+    ends1, ends2 = np.array(a.ends), np.array(b.ends)
+    axes = [(0.0, 1.0)]
+    for p, q in (ends1, ends2):
+        seg = q - p
+        norm = math.hypot(seg[0], seg[1])
+        if norm:
+            axes += ((-seg[1] / norm, seg[0] / norm), (seg[0] / norm, seg[1] / norm))
+    axes = np.array(axes)
+    proj1, proj2 = axes @ ends1.T, axes @ ends2.T
+    return least_overlap(
+        axes,
+        proj1.min(axis=1) - a.radius,
+        proj1.max(axis=1) + a.radius,
+        proj2.min(axis=1) - b.radius,
+        proj2.max(axis=1) + b.radius,
+    )
+
+
+def collide_capsule_polygon(a, b):
+    """Capsule vs polygon (or box) -- polygon axes, the segment normal + the axes to the closest vertices"""
+    polygon = b.polygon
+    vertices = polygon.vertices
+    ends = np.array(a.ends)
+    axes = [polygon.axes]
+    seg = ends[1] - ends[0]
+    norm = math.hypot(seg[0], seg[1])
+    if norm:
+        axes.append(np.array(((-seg[1] / norm, seg[0] / norm),)))
+    for end in ends:
+        closest = vertices[((vertices - end) ** 2).sum(axis=1).argmin()]
+        axis = end - closest
+        norm = math.hypot(axis[0], axis[1])
+        if norm:
+            axes.append((axis / norm)[None])
+    axes = np.concatenate(axes)
+    proj = axes @ vertices.T
+    ends = axes @ ends.T
+    return least_overlap(
+        axes,
+        ends.min(axis=1) - a.radius,
+        ends.max(axis=1) + a.radius,
+        proj.min(axis=1),
+        proj.max(axis=1),
+    )
+
+
+# (kind, kind) -> test, the reversed pair is looked up + negated
+COLLIDERS = {}
+
+
+def register_collider(kind1: str, kind2: str, func):
+    """Register the narrow phase test for a pair of shape kinds"""
+    COLLIDERS[(kind1, kind2)] = func
+
+
+def collide(shape1: Shape, shape2: Shape):
+    """Minimum translation vector that moves shape1 out of shape2 -- None if they don't touch"""
+    if not aabb_overlap(shape1.bounds, shape2.bounds):
+        return None
+    func = COLLIDERS.get((shape1.KIND, shape2.KIND))
+    if func:
+        return func(shape1, shape2)
+    func = COLLIDERS.get((shape2.KIND, shape1.KIND))
+    if func:
+        mtv = func(shape2, shape1)
+        return -mtv if mtv is not None else None
+    raise NotImplementedError(f"No collider for {shape1.KIND} + {shape2.KIND}")
+
+
+register_collider("rect", "rect", collide_rect_rect)
+register_collider("circle", "circle", collide_circle_circle)
+register_collider("circle", "rect", collide_circle_rect)
+register_collider("circle", "polygon", collide_circle_polygon)
+register_collider("polygon", "polygon", collide_polygon_polygon)
+register_collider("polygon", "rect", collide_polygon_polygon)
+register_collider("capsule", "circle", collide_capsule_circle)
+register_collider("capsule", "capsule", collide_capsule_capsule)
+register_collider("capsule", "polygon", collide_capsule_polygon)
+register_collider("capsule", "rect", collide_capsule_polygon)
+
+
+# ------------------------------------------------------------ #
+# broadphase
+# ------------------------------------------------------------ #
+
+
+class SpatialHash:
+    """
+    Uniform grid broadphase
+    - entities are bucketed by the cells their rect covers
+    - `update` only re-buckets an entity when its rect moved into different cells
+    - `query` returns the entities in the cells a rect covers
+    """
+
+    def __init__(self, cell_size: int = 64):
+        self.cell_size = cell_size
+        self._cells = {}  # (cx, cy): {entity hash: entity}
+        self._ranges = {}  # entity hash: (cx0, cy0, cx1, cy1)
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def __contains__(self, entity):
+        return hash(entity) in self._ranges
 
-    # Test all the normals (edge directions) of shape1
-    for i in range(len(shape1)):
-        edge = shape1[i] - shape1[i - 1]
-        axis = pgmath.Vector2(-edge.y, edge.x).normalize()
-        if is_separated(shape1, shape2, axis):
-            return False
+    def cell_range(self, rect) -> tuple:
+        """Cells covered by a rect"""
+        c = self.cell_size
+        return (
+            rect.left // c,
+            rect.top // c,
+            (rect.right - 1) // c if rect.w else rect.left // c,
+            (rect.bottom - 1) // c if rect.h else rect.top // c,
+        )
+
+    def update(self, entity):
+        """Insert an entity or move it to the cells its rect covers now"""
+        key = hash(entity)
+        new = self.cell_range(entity.rect)
+        old = self._ranges.get(key)
+        if new == old:
+            return
+        if old:
+            self._remove_cells(key, old)
+        self._ranges[key] = new
+        cells = self._cells
+        for cx in range(new[0], new[2] + 1):
+            for cy in range(new[1], new[3] + 1):
+                if (cx, cy) in cells:
+                    cells[(cx, cy)][key] = entity
+                else:
+                    cells[(cx, cy)] = {key: entity}
+
+    def remove(self, entity):
+        """Take an entity out of the grid"""
+        key = hash(entity)
+        if key in self._ranges:
+            self._remove_cells(key, self._ranges.pop(key))
+
+    def _remove_cells(self, key, span):
+        cells = self._cells
+        for cx in range(span[0], span[2] + 1):
+            for cy in range(span[1], span[3] + 1):
+                bucket = cells[(cx, cy)]
+                del bucket[key]
+                if not bucket:
+                    del cells[(cx, cy)]
+
+    def query(self, rect):
+        """Entities in the cells a rect covers -- each one once"""
+        x0, y0, x1, y1 = self.cell_range(rect)
+        cells = self._cells
+        if x0 == x1 and y0 == y1:
+            bucket = cells.get((x0, y0))
+            return list(bucket.values()) if bucket else []
+        found = {}
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return list(found.values())
+
+
+# ------------------------------------------------------------ #
+# particle stamps
+"""
+Particles are drawn by blitting pre rendered stamps instead of rasterizing every shape every frame
+- stamps are keyed by shape, radius, quantized angle + quantized colour
+- least recently used stamps are evicted once the cache is full
+- stamps use a colour key instead of per pixel alpha, it blits a lot faster
+- single particles are only stamped once their key repeats + never evict, other keys are drawn directly
+"""
+# ------------------------------------------------------------ #
+
+
+def blit_all(surface, blits):
+    """Blit an iterable of (surface, position) in one call"""
+    if hasattr(surface, "fblits"):
+        surface.fblits(blits)
+    else:
+        surface.blits(blits, doreturn=False)
 
-    # Test all the normals (edge directions) of shape2
-    for i in range(len(shape2)):
-        edge = shape2[i] - shape2[i - 1]
-        axis = pgmath.Vector2(-edge.y, edge.x).normalize()
-        if is_separated(shape1, shape2, axis):
-            return False
 
-    # If no separations were found, the shapes are intersecting
-    return True
+class StampCache:
+    # shape name -> (unit points, rotational period in degrees) -- no points is a filled circle
+    SHAPES = {"circle": (None, 360)}
+
+    @classmethod
+    def register_shape(cls, name, points, period: float = 360):
+        """Register an outlined shape"""
+        cls.SHAPES[name] = (tuple((float(x), float(y)) for x, y in points), period)
+
+    def __init__(
+        self, capacity: int = 4096, angle_steps: int = 36, color_step: int = 16
+    ):
+        self._stamps = OrderedDict()
+        self._seen = set()
+        self.capacity = capacity
+        self.angle_steps = angle_steps
+        self.color_step = color_step
+
+    def __len__(self):
+        return len(self._stamps)
+
+    def clear(self):
+        """Drop every stamp"""
+        self._stamps.clear()
+        self._seen.clear()
+
+    def draw(self, surface, shape: str, radius: float, angle: float, color, position):
+        """Draw a shape straight onto a surface -- no stamp is made"""
+        points, period = self.SHAPES[shape]
+        if points is None:
+            pgdraw.circle(surface, color, position, radius)
+        else:
+            pgdraw.polygon(
+                surface,
+                color,
+                [pgmath.Vector2(p).rotate(angle) * radius + position for p in points],
+                1,
+            )
+
+    def render(self, shape: str, radius: int, step: int, color: tuple):
+        """Rasterize a stamp -- returns the surface + its half size"""
+        points, period = self.SHAPES[shape]
+        half = radius + 1
+        surface = pSurface((half * 2 + 1, half * 2 + 1))
+        # the inverse colour is never the stamp's colour
+        key = (255 - color[0], 255 - color[1], 255 - color[2])
+        surface.fill(key)
+        surface.set_colorkey(key)
+        if points is None:
+            pgdraw.circle(surface, color, (half, half), radius)
+        else:
+            angle = step * period / self.angle_steps
+            points = [
+                pgmath.Vector2(p).rotate(angle) * radius + (half, half) for p in points
+            ]
+            pgdraw.polygon(surface, color, points, 1)
+        return surface, half
+
+    def get(self, shape: str, radius: int, step: int, color: tuple):
+        """Get a stamp by its quantized key"""
+        key = (shape, radius, step, color)
+        stamp = self._stamps.get(key)
+        if stamp:
+            self._stamps.move_to_end(key)
+            return stamp
+        stamp = self._stamps[key] = self.render(shape, radius, step, color)
+        if len(self._stamps) > self.capacity:
+            self._stamps.popitem(last=False)
+        return stamp
+
+    def quantize_colors(self, colors):
+        """Round colours to the nearest step -- full brightness stays 255"""
+        c = self.color_step
+        return np.minimum(255, (colors + c // 2) // c * c)
+
+    def stamp(self, shape: str, radius: float, angle: float, color):
+        """Get a stamp for one particle -- None the first time a key is seen"""
+        period = self.SHAPES[shape][1]
+        step = int(round(angle % period * self.angle_steps / period)) % self.angle_steps
+        c = self.color_step
+        h = c // 2
+        key = (
+            shape,
+            max(1, int(round(radius))),
+            step,
+            (
+                min(255, (int(color[0]) + h) // c * c),
+                min(255, (int(color[1]) + h) // c * c),
+                min(255, (int(color[2]) + h) // c * c),
+            ),
+        )
+        stamp = self._stamps.get(key)
+        if stamp:
+            self._stamps.move_to_end(key)
+            return stamp
+        # a full cache is not churned for single particles -- new keys are drawn directly
+        if key in self._seen and len(self._stamps) < self.capacity:
+            self._seen.discard(key)
+            return self.get(*key)
+        if len(self._seen) >= self.capacity:
+            self._seen.clear()
+        self._seen.add(key)
+        return None
+
+    def stamps(self, shape: str, radii, angles, colors):
+        """Get stamps for a batch of particles -- returns a list of surfaces + their half sizes"""
+        period = self.SHAPES[shape][1]
+        radii = np.maximum(1, np.rint(radii)).astype(np.int64)
+        steps = np.rint(np.mod(angles, period) * (self.angle_steps / period)).astype(
+            np.int64
+        ) % self.angle_steps
+        colors = self.quantize_colors(np.asarray(colors, dtype=np.int64))
+        # one key per distinct stamp
+        keys = (
+            ((radii * self.angle_steps + steps) << 24)
+            | (colors[:, 0] << 16)
+            | (colors[:, 1] << 8)
+            | colors[:, 2]
+        )
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        surfaces = np.empty(len(unique), dtype=object)
+        for i, j in enumerate(first.tolist()):
+            surfaces[i] = self.get(
+                shape, int(radii[j]), int(steps[j]), tuple(colors[j].tolist())
+            )[0]
+        return surfaces[inverse.ravel()].tolist(), radii + 1
 
 
 # ------------------------------------------------------------ #
@@ -196,6 +1394,12 @@ class ParticleHandler(Entity):
     DEFAULT_UPDATE = "default_update"
     DEFAULT_TIMER = "default_timer"
 
+    STAMPS = StampCache()
+
+    # particle ids -- low bits are the slot, high bits count how many times the slot was reused
+    ID_BITS = 24
+    ID_MASK = (1 << ID_BITS) - 1
+
     @classmethod
     def register_create_function(cls, name, func):
         """Register a create function"""
@@ -249,22 +1453,39 @@ class ParticleHandler(Entity):
         self._particles = {}
         self._particle_count = 0
         self._max_particles = max_particles
+        # free slots are handed out from the end
+        self._free = list(range(max_particles - 1, -1, -1))
+        self._generations = [0] * max_particles
         self._data = {"interval": 0.1}
         self._timer = 0
+        self._bursts = []
         self._remove = []
+        self._blits = []
         self.args = args
 
         # public
         self._function_data = [create_func, update_func, create_timer_func]
-        self.create_timer_func = ParticleHandler.get_create_timer_funcion(
+        self.create_timer_func = type(self).get_create_timer_funcion(
             name=create_timer_func
         )
-        self.create_func = ParticleHandler.get_create_function(name=create_func)
-        self.update_func = ParticleHandler.get_update_function(name=update_func)
+        self.create_func = type(self).get_create_function(name=create_func)
+        self.update_func = type(self).get_update_function(name=update_func)
 
     def get_new_particle_id(self):
-        """Get a new particle id"""
+        """Get a new particle id -- ids of dead particles are never handed out again"""
+        slot = self._free.pop()
         self._particle_count += 1
+        return self._generations[slot] << self.ID_BITS | slot
+
+    def free_particle_id(self, pid: int):
+        """Give a dead particle's slot back to the pool"""
+        slot = pid & self.ID_MASK
+        self._generations[slot] += 1
+        self._free.append(slot)
+        self._particle_count -= 1
+
+    def __len__(self):
+        """Number of live particles"""
         return self._particle_count
 
     @property
@@ -284,16 +1505,66 @@ class ParticleHandler(Entity):
         """Remove a particle"""
         self._remove.append(particle[-1])
 
+    # === emission
+    def burst(self, count: int, delay: float = 0.0):
+        """Schedule `count` particles to be emitted together after `delay` seconds"""
+        self._bursts.append([delay, count])
+
+    def scheduled(self) -> int:
+        """
+        Number of particles due this frame
+        - the time left over from the interval carries into the next frame
+        - an interval of 0 turns continuous emission off, only bursts are emitted
+        """
+        self._timer += SORA.DELTA
+        count = 0
+        interval = self._data["interval"]
+        if interval > 0:
+            count = int(self._timer / interval)
+            self._timer -= count * interval
+        if self._bursts:
+            for burst in self._bursts:
+                burst[0] -= SORA.DELTA
+                if burst[0] <= 0:
+                    count += burst[1]
+            self._bursts = [burst for burst in self._bursts if burst[0] > 0]
+        return count
+
+    def emit(self, count: int = 1, **kwargs):
+        """Create up to `count` particles -- returns their ids, extras are dropped when full"""
+        ids = []
+        for _ in range(min(count, len(self._free))):
+            particle = self.create_func(self, **kwargs)
+            self._particles[particle[-1]] = particle
+            ids.append(particle[-1])
+        return ids
+
+    def stamp(self, shape: str, radius: float, angle: float, color, position):
+        """Queue a particle stamp -- drawn with the rest after the update"""
+        stamp = self.STAMPS.stamp(shape, radius, angle, color)
+        if stamp is None:
+            self.STAMPS.draw(SORA.FRAMEBUFFER, shape, radius, angle, color, position)
+            return
+        surface, half = stamp
+        self._blits.append((surface, (position[0] - half, position[1] - half)))
+
+    def render(self):
+        """Blit every queued stamp"""
+        if self._blits:
+            blit_all(SORA.FRAMEBUFFER, self._blits)
+            self._blits.clear()
+
     def update(self):
         """Update the Particle Handler"""
         # print(self._function_data)
         self.create_timer_func(self)
         for particle in self._particles.values():
             self.update_func(self, particle)
+        self.render()
         # remove timer
         for i in self._remove:
             del self._particles[i]
-        # self._particle_count -= len(self._remove) # when removing particles bad things happen
+            self.free_particle_id(i)
         self._remove.clear()
 
 
@@ -325,20 +1596,15 @@ def _default_update(parent, particle):
     # move
     particle[0] += particle[1]
     # render
-    pgdraw.circle(SORA.FRAMEBUFFER, particle[3], particle[0], particle[2])  # , 1)
+    parent.stamp("circle", particle[2], 0, particle[3], particle[0])
 
 
 # timer function
 def _default_timer(parent):
     """Default timer function for particles"""
-    parent._timer += SORA.DELTA
-    if parent._timer >= parent._data["interval"]:
-        # print(parent._function_data)
-        parent._timer = 0
-        particle = parent.create_func(parent, **parent.args)
-        # print("created particle")
-        parent._particles[particle[-1]] = particle
-        # print(parent._particle_count)
+    count = parent.scheduled()
+    if count:
+        parent.emit(count, **parent.args)
 
 
 # update function
@@ -349,3 +1615,340 @@ ParticleHandler.register_update_function(
     ParticleHandler.DEFAULT_UPDATE, _default_update
 )
 ParticleHandler.register_timer_function(ParticleHandler.DEFAULT_TIMER, _default_timer)
+
+
+# ------------------------------------------------------------ #
+# array particles
+"""
+Struct of arrays particle backend
+- every attribute lives in a fixed capacity numpy array, live particles are packed at the front
+- create / update / timer functions are kernels that work on a whole batch at once
+    - create(parent, index, **kwargs) -- fill the slots in `index`
+    - update(parent, count) -- step the first `count` particles
+    - render(parent, count) -- return blits for the first `count` particles (or draw them)
+- dead particles (life <= 0) are culled after each update
+"""
+# ------------------------------------------------------------ #
+
+
+class ArrayParticleHandler(ParticleHandler):
+    CREATE = {}
+    UPDATE = {}
+    TIMER_FUNC = {}
+    RENDER = {}
+
+    DEFAULT_RENDER = "default_render"
+
+    # attribute name -> (shape, dtype)
+    FIELDS = {
+        "positions": ((2,), np.float64),
+        "velocities": ((2,), np.float64),
+        "lives": ((), np.float64),
+        "sizes": ((), np.float64),
+        "angles": ((), np.float64),
+        "spins": ((), np.float64),
+        "colors": ((3,), np.uint8),
+    }
+
+    @classmethod
+    def register_render_function(cls, name, func):
+        """Register a render function"""
+        cls.RENDER[name] = func
+
+    @classmethod
+    def get_render_function(cls, name):
+        """Get a render function"""
+        return (
+            cls.RENDER[name] if name in cls.RENDER else cls.RENDER[cls.DEFAULT_RENDER]
+        )
+
+    # ------------------------------ #
+
+    def __init__(
+        self,
+        args: dict = {},
+        max_particles: int = 10000,
+        create_func: str = None,
+        update_func: str = None,
+        create_timer_func: str = None,
+        render_func: str = None,
+    ):
+        super().__init__(
+            args, max_particles, create_func, update_func, create_timer_func
+        )
+        self._function_data.append(render_func)
+        self.render_func = type(self).get_render_function(
+            name=render_func if render_func else update_func
+        )
+        self._count = 0
+        self._system = None
+        self._resolved = False
+        # ids of the particles emitted into the system -- dead ones are pruned when read
+        self._owned = np.zeros(0, dtype=np.int64)
+        self._allocated = False
+        # the list pool is replaced by arrays in `allocate`
+        self._free = self._generations = None
+
+    def allocate(self):
+        """Allocate the arrays -- done on the first emit, handlers in a ParticleSystem never need them"""
+        max_particles = self._max_particles
+        self._allocated = True
+        for name, (shape, dtype) in self.FIELDS.items():
+            setattr(self, name, np.zeros((max_particles,) + shape, dtype=dtype))
+        # slot map -- ids stay valid while particles move around inside the arrays
+        self._ids = np.zeros(max_particles, dtype=np.int64)
+        self._index = np.zeros(max_particles, dtype=np.int64)
+        self._generations = np.zeros(max_particles, dtype=np.int64)
+        self._free = np.arange(max_particles - 1, -1, -1, dtype=np.int64)
+        self._free_top = max_particles
+        self._alive_mask = np.zeros(max_particles, dtype=bool)
+        self._order = np.arange(max_particles, dtype=np.int64)
+
+    def __len__(self):
+        """Number of live particles"""
+        if self._system is not None:
+            return len(self.ids)
+        return self._count
+
+    @property
+    def storage(self) -> "ArrayParticleHandler":
+        """The handler whose arrays hold the particles -- a ParticleSystem group if there is one"""
+        return self._system.group_for(self) if self._system is not None else self
+
+    def emit(self, count: int = 1, **kwargs):
+        """Create up to `count` particles in one batch -- returns their ids, extras are dropped when full"""
+        if self._system is not None:
+            owned = self._owned
+            if len(owned) + count > self._max_particles:
+                # only drop the dead ids when the cap could be hit
+                owned = self.ids
+            count = min(count, self._max_particles - len(owned))
+            if count <= 0:
+                return np.zeros(0, dtype=np.int64)
+            ids = self._system.emit(self, count, **kwargs)
+            self._owned = np.concatenate((owned, ids))
+            return ids
+        if not self._allocated:
+            self.allocate()
+        count = min(count, self._free_top)
+        if count <= 0:
+            return np.zeros(0, dtype=np.int64)
+        slots = self._free[self._free_top - count : self._free_top]
+        self._free_top -= count
+        index = self._order[self._count : self._count + count]
+        self._ids[index] = self._generations[slots] << self.ID_BITS | slots
+        self._index[slots] = index
+        self._count += count
+        self._particle_count = self._count
+        self.create_func(self, index, **kwargs)
+        return self._ids[index]
+
+    @property
+    def ids(self):
+        """Ids of the live particles, in array order"""
+        if self._system is not None:
+            self._owned = self._owned[self.storage.indices_of(self._owned) >= 0]
+            return self._owned
+        return self._ids[: self._count] if self._allocated else np.zeros(0, np.int64)
+
+    def index_of(self, pid: int) -> int:
+        """Array index of a particle in `storage` -- -1 once it is dead"""
+        if self._system is not None:
+            return self.storage.index_of(pid) if pid in self.ids else -1
+        slot = pid & self.ID_MASK
+        if not self._allocated or slot >= self._max_particles or self._generations[slot] != pid >> self.ID_BITS:
+            return -1
+        index = int(self._index[slot])
+        return index if index < self._count and self._ids[index] == pid else -1
+
+    def indices_of(self, pids):
+        """Array indices of a batch of particles -- -1 for the dead ones"""
+        pids = np.asarray(pids, dtype=np.int64)
+        if not self._allocated:
+            return np.full(len(pids), -1, dtype=np.int64)
+        slots = np.minimum(pids & self.ID_MASK, self._max_particles - 1)
+        index = self._index[slots]
+        alive = (
+            (self._generations[slots] == pids >> self.ID_BITS)
+            & (index < self._count)
+            & (self._ids[index] == pids)
+        )
+        return np.where(alive, index, -1)
+
+    def remove_particle(self, index):
+        """Remove particles by index -- culled after the update"""
+        self.lives[index] = 0
+
+    def cull(self):
+        """
+        Remove dead particles
+        - the last live particles are moved into the holes, nothing is reallocated
+        - freed slots go back on the free list with a new generation
+        """
+        count = self._count
+        alive = np.greater(self.lives[:count], 0, out=self._alive_mask[:count])
+        live = int(np.count_nonzero(alive))
+        if live == count:
+            return
+        dead = np.flatnonzero(~alive)
+        freed = self._ids[dead] & self.ID_MASK
+        holes = dead[: np.searchsorted(dead, live)]
+        movers = np.flatnonzero(alive[live:]) + live
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[holes] = array[movers]
+        self._ids[holes] = self._ids[movers]
+        self._index[self._ids[holes] & self.ID_MASK] = holes
+        self._generations[freed] += 1
+        self._free[self._free_top : self._free_top + len(freed)] = freed
+        self._free_top += len(freed)
+        self._count = self._particle_count = live
+
+    def step(self):
+        """Step + cull the particles"""
+        if self._count:
+            self.update_func(self, self._count)
+            self.cull()
+
+    def render(self):
+        """Draw the particles -- render functions return blits or draw by themselves"""
+        if self._count:
+            blits = self.render_func(self, self._count)
+            if blits:
+                blit_all(SORA.FRAMEBUFFER, blits)
+
+    def update(self):
+        """Update the Particle Handler"""
+        if not self._resolved:
+            # emit into the world's particle system if it has one -- before anything is emitted
+            self._resolved = True
+            self._system = self.world.get_aspect(ParticleSystem) if self.world else None
+        self.create_timer_func(self)
+        if self._system is not None:
+            return
+        self.step()
+        self.render()
+
+
+# ------------------------------ #
+# default for circle particles
+
+
+def _array_default_create(parent, index, **kwargs):
+    """Default create kernel for array particles"""
+    parent.positions[index] = parent.position.xy
+    if "vel" in kwargs:
+        parent.velocities[index] = kwargs["vel"]
+    else:
+        parent.velocities[index, 0] = np.random.random(len(index)) - 0.5
+        parent.velocities[index, 1] = -5
+    parent.sizes[index] = kwargs["radius"] if "radius" in kwargs else 2
+    parent.colors[index] = kwargs["color"] if "color" in kwargs else (0, 0, 255)
+    parent.lives[index] = kwargs["life"] if "life" in kwargs else 1.0
+    parent.angles[index] = 0
+    parent.spins[index] = 0
+
+
+def _array_default_update(parent, count):
+    """Default update kernel for array particles"""
+    live = slice(0, count)
+    parent.velocities[live] += tuple(World2D.GRAVITY * SORA.DELTA)
+    parent.lives[live] -= SORA.DELTA
+    # move -- velocity is per frame, like the default particles
+    parent.positions[live] += parent.velocities[live]
+
+
+def array_stamp_blits(parent, count, shape: str):
+    """Blits for the first `count` particles as `shape` stamps -- skips anything off screen"""
+    w, h = SORA.FRAMEBUFFER.get_size()
+    positions, sizes = parent.positions[:count], parent.sizes[:count]
+    visible = np.flatnonzero(
+        (positions[:, 0] + sizes >= 0)
+        & (positions[:, 0] - sizes < w)
+        & (positions[:, 1] + sizes >= 0)
+        & (positions[:, 1] - sizes < h)
+    )
+    if not len(visible):
+        return []
+    surfaces, halves = parent.STAMPS.stamps(
+        shape, sizes[visible], parent.angles[visible], parent.colors[visible]
+    )
+    corners = np.rint(positions[visible] - halves[:, None]).astype(np.int64)
+    return zip(surfaces, corners.tolist())
+
+
+def _array_default_render(parent, count):
+    """Default render function for array particles"""
+    return array_stamp_blits(parent, count, "circle")
+
+
+ArrayParticleHandler.register_create_function(
+    ArrayParticleHandler.DEFAULT_CREATE, _array_default_create
+)
+ArrayParticleHandler.register_update_function(
+    ArrayParticleHandler.DEFAULT_UPDATE, _array_default_update
+)
+ArrayParticleHandler.register_timer_function(
+    ArrayParticleHandler.DEFAULT_TIMER, _default_timer
+)
+ArrayParticleHandler.register_render_function(
+    ArrayParticleHandler.DEFAULT_RENDER, _array_default_render
+)
+
+
+# ------------------------------ #
+# particle system
+
+
+class ParticleSystem(scene.Aspect):
+    """
+    Particle System
+    - owns the particles of every ArrayParticleHandler in the world
+    - handlers only run their timers + emit into the system
+    - particles are stored + stepped by behaviour (create / update / render functions), not by handler
+    - every group is drawn in one blit pass, sorted by the handlers' "layer" data
+    """
+
+    def __init__(self, capacity: int = 65536):
+        super().__init__([])
+        self.priority = 3
+        self.capacity = capacity
+        self._groups = {}
+        self._order = []
+
+    def group_for(self, handler) -> ArrayParticleHandler:
+        """Get the storage shared by handlers that behave like `handler`"""
+        key = (
+            handler._data["layer"] if "layer" in handler._data else 0,
+            handler.create_func,
+            handler.update_func,
+            handler.render_func,
+        )
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = ArrayParticleHandler(max_particles=self.capacity)
+            group.create_func, group.update_func, group.render_func = key[1:]
+            self._order = [self._groups[k] for k in sorted(self._groups, key=lambda k: k[0])]
+        return group
+
+    def emit(self, handler, count: int = 1, **kwargs):
+        """Emit particles for a handler -- they start at the handler's position, returns their ids"""
+        group = self.group_for(handler)
+        group.position.xy = handler.position.xy
+        return group.emit(count, **kwargs)
+
+    def __len__(self):
+        """Number of live particles"""
+        return sum(len(group) for group in self._groups.values())
+
+    def handle(self):
+        """Step every group, then draw them all at once"""
+        blits = []
+        for group in self._order:
+            group.step()
+            if group._count:
+                result = group.render_func(group, group._count)
+                if result:
+                    blits.append(result)
+        if blits:
+            blit_all(SORA.FRAMEBUFFER, chain.from_iterable(blits))
@@ -188,6 +188,10 @@ class Component:
         """When an added to an Entity"""
         pass
 
+    def on_remove(self):
+        """When removed from an Entity -- or its Entity leaves the world"""
+        pass
+
     def __hash__(self):
         """Hash the component"""
         return hash(self.__class__)
@@ -223,6 +227,10 @@ class World:
         # rendering
         self._center_chunk = [0, 0]
         self._dev = {}
+        # physics.TransformStore -- made by the first compact entity added
+        self.transforms = None
+        # physics.SpatialHash -- made by Collision2DAspect
+        self.spatial_hash = None
 
         # variables
         self.render_distance = render_distance
@@ -256,6 +264,18 @@ class World:
         )
         c._intrinstic_entities.add(hash(entity))
 
+    def remove_entity(self, entity):
+        """Remove an entity from the world -- its components stay on it"""
+        h = hash(entity)
+        for comp_hash, component in entity._components.items():
+            if comp_hash in self._components:
+                self._components[comp_hash].discard(h)
+            component.on_remove()
+        for chunk in self._chunks.values():
+            chunk._intrinstic_entities.discard(h)
+        self._scene.remove_entity(entity)
+        self._scene._new_entities.discard(entity)
+
     def update_entity_chunk(self, entity, old, new):
         """Update the chunk intrinsic properties for entities"""
         ochunk = self.get_chunk(old[0], old[1])
@@ -285,10 +305,13 @@ class World:
         component.on_add()
 
     def remove_component(self, entity, comp_class):
-        """Remove a component from an entity"""
-        if comp_class.get_hash() in self._components:
-            self._components[comp_class.get_hash()].remove(hash(entity))
-            entity.components.remove(comp_class.get_hash())
+        """Remove a component from an entity -- the component or its class"""
+        comp_hash = hash(comp_class)
+        if comp_hash in self._components:
+            self._components[comp_hash].discard(hash(entity))
+        component = entity._components.pop(comp_hash, None)
+        if component is not None:
+            component.on_remove()
 
     # == chunks
     def add_chunk(self, chunk):
@@ -8,7 +8,7 @@ from queue import deque, Queue
 # ------------------------------------------------------------ #
 
 SIGNALS = {}
-EMIT_QUEUE = Queue(100)
+EMIT_QUEUE = Queue()
 
 def register_signal(signal_register: "SignalRegister"):
     """Register a signal to the system"""
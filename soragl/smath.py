@@ -34,6 +34,39 @@ def lerpvec(a, b, t):
     return Vector2(lerp(a[0], b[0], t), lerp(a[1], b[1], t))
 
 
+def solve_tridiagonal(lower, diag, upper, rhs):
+    """
+    Solve a tridiagonal system with parallel cyclic reduction
+    - lower[i] multiplies x[i - 1] + upper[i] multiplies x[i + 1]
+    - lower[0] + upper[-1] are ignored
+    - each of the log2(n) reductions is a whole-array operation
+    """
+    a = np.array(lower, dtype=np.float64)
+    b = np.array(diag, dtype=np.float64)
+    c = np.array(upper, dtype=np.float64)
+    d = np.array(rhs, dtype=np.float64)
+    a[:1] = 0
+    c[-1:] = 0
+    n = len(b)
+    s = 1
+    while s < n:
+        # eliminate the neighbours s rows away
+        alpha = -a[s:] / b[:-s]
+        gamma = -c[:-s] / b[s:]
+        b[s:] += alpha * c[:-s]
+        b[:-s] += gamma * a[s:]
+        nd = d.copy()
+        nd[s:] += alpha * d[:-s]
+        nd[:-s] += gamma * d[s:]
+        na = np.zeros(n)
+        na[s:] = alpha * a[:-s]
+        nc = np.zeros(n)
+        nc[:-s] = gamma * c[s:]
+        a, c, d = na, nc, nd
+        s *= 2
+    return d / b
+
+
 
 # ------------------------------------------------------------ #
 # curve functions
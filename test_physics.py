@@ -0,0 +1,476 @@
+"""
+Physics tests
+- runs headless with SDL's dummy video driver
+
+usage:
+    python -m pytest -q test_physics.py
+"""
+
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pytest
+import pygame
+import soragl as SORA
+
+SORA.initialize({"window_size": [320, 180], "framebuffer_size": [320, 180]})
+SORA.create_context()
+
+from soragl import scene, physics, base_objects, signal
+from scripts import ball
+
+
+def make_layer():
+    """A scene layer to add entities + aspects to"""
+    sc = scene.Scene(config=scene.load_config(scene.Scene.DEFAULT_CONFIG))
+    return sc, sc.make_layer(sc.get_config(), 1)
+
+
+# ------------------------------- #
+# compact entities
+
+
+def test_kinematic_moves_compact_entities():
+    sc, layer = make_layer()
+    layer.add_aspect(physics.Kinematic2DAspect())
+    e = physics.CompactEntity()
+    e.position.xy = (10, 20)
+    e.velocity.xy = (60, -30)
+    layer.add_entity(e)
+    e.add_component(physics.Kinematic2DComponent())
+    SORA.DELTA = 0.5
+    sc.update()
+    assert tuple(e.position) == pytest.approx((40, 5))
+
+
+def test_kinematic_rejects_plain_entities():
+    sc, layer = make_layer()
+    e = physics.Entity()
+    layer.add_entity(e)
+    with pytest.raises(TypeError, match="CompactEntity"):
+        e.add_component(physics.Kinematic2DComponent())
+
+
+def test_removed_kinematic_entities_stop():
+    sc, layer = make_layer()
+    layer.add_aspect(physics.Kinematic2DAspect())
+    kept, removed, unmarked = physics.CompactEntity(), physics.CompactEntity(), physics.CompactEntity()
+    for e in (kept, removed, unmarked):
+        e.velocity.xy = (6000, 0)
+        layer.add_entity(e)
+        e.add_component(physics.Kinematic2DComponent())
+    layer.remove_entity(removed)
+    unmarked.remove_component(physics.Kinematic2DComponent)
+    SORA.DELTA = 0.5
+    for _ in range(3):
+        sc.update()
+    assert kept.position.x == pytest.approx(9000)
+    assert removed.position.x == unmarked.position.x == 0
+
+
+# ------------------------------- #
+# SAT
+
+
+def random_polygon(rng, sides: int, radius: float = 10) -> physics.ConvexPolygon:
+    """A convex polygon with its vertices on a circle"""
+    angles = np.sort(rng.uniform(0, 2 * np.pi, sides))
+    vertices = np.stack((np.cos(angles), np.sin(angles)), axis=1) * radius
+    return physics.ConvexPolygon(vertices, rng.uniform(0, 30, 2), rng.uniform(0, 360))
+
+
+class Outline:
+    """Anything with `get_vertices`"""
+
+    def __init__(self, vertices):
+        self.vertices = [pygame.math.Vector2(v) for v in vertices]
+
+    def get_vertices(self):
+        return self.vertices
+
+
+def test_sat_batch_matches_sat():
+    rng = np.random.default_rng(0)
+    shapes1 = [random_polygon(rng, int(rng.integers(3, 8))) for _ in range(200)]
+    shapes2 = [random_polygon(rng, int(rng.integers(3, 8))) for _ in range(200)]
+    hits, mtvs = physics.sat_batch(shapes1, shapes2)
+    assert 0 < hits.sum() < len(hits)
+    for a, b, hit, mtv in zip(shapes1, shapes2, hits, mtvs):
+        single = physics.sat(a, b)
+        assert hit == (single is not None)
+        if hit:
+            assert tuple(single) == pytest.approx(tuple(mtv))
+
+
+def test_sat_mtv_separates():
+    rng = np.random.default_rng(1)
+    checked = 0
+    for _ in range(300):
+        a, b = random_polygon(rng, 5), random_polygon(rng, 4)
+        mtv = physics.sat(a, b)
+        if mtv is None:
+            continue
+        checked += 1
+        position = np.array(a.position)
+        a.set_transform(position + np.array(mtv) * 1.001, a.angle)
+        assert physics.sat(a, b) is None
+        # anything shorter still overlaps
+        a.set_transform(position + np.array(mtv) * 0.9, a.angle)
+        assert physics.sat(a, b) is not None
+    assert checked > 20
+
+
+def test_overlap_general_counts_touching():
+    square = [(0, 0), (10, 0), (10, 10), (0, 10)]
+    a = Outline(square)
+    b = Outline([(x + 10, y) for x, y in square])
+    c = Outline([(x + 10.5, y) for x, y in square])
+    assert physics.overlap_general(a, b)
+    assert not physics.overlap_general(a, c)
+    # the polygon is kept on the object + only moved while the outline is the same
+    polygon = physics.as_polygon(c)
+    c.vertices = [v + (3, 4) for v in c.vertices]
+    assert physics.as_polygon(c) is polygon
+    assert tuple(polygon.vertices[0]) == (13.5, 4)
+
+
+KINDS = ("rect", "circle", "polygon", "capsule")
+
+
+def random_shape(rng, kind: str) -> physics.Shape:
+    """A shape of `kind` around the origin"""
+    x, y = rng.uniform(0, 30, 2)
+    if kind == "rect":
+        return physics.RectShape(pygame.Rect(int(x), int(y), *rng.integers(4, 20, 2).tolist()))
+    if kind == "circle":
+        shape = physics.CircleShape(rng.uniform(2, 10))
+    elif kind == "polygon":
+        shape = physics.PolygonShape(random_polygon(rng, int(rng.integers(3, 7))).local_vertices)
+    else:
+        shape = physics.CapsuleShape(rng.uniform(0, 20), rng.uniform(2, 8))
+    shape.set_transform((x, y), rng.uniform(0, 360))
+    return shape
+
+
+def move_shape(shape: physics.Shape, offset):
+    """Move a shape by `offset` -- rects only move whole pixels"""
+    if shape.KIND == "rect":
+        shape.rect.move_ip(round(offset[0]), round(offset[1]))
+    else:
+        x, y, angle = shape._transform
+        shape.set_transform((x + offset[0], y + offset[1]), angle)
+
+
+@pytest.mark.parametrize("kind1", KINDS)
+@pytest.mark.parametrize("kind2", KINDS)
+def test_collide_mtv_separates(kind1, kind2):
+    rng = np.random.default_rng(KINDS.index(kind1) * 4 + KINDS.index(kind2))
+    checked = 0
+    for _ in range(200):
+        a, b = random_shape(rng, kind1), random_shape(rng, kind2)
+        mtv = physics.collide(a, b)
+        # the reversed pair pushes the other way
+        reverse = physics.collide(b, a)
+        assert (mtv is None) == (reverse is None)
+        if mtv is None:
+            continue
+        checked += 1
+        if kind1 != kind2:
+            assert tuple(reverse) == pytest.approx(tuple(-mtv), abs=1e-6)
+        else:
+            # the same test -- ties (like equal centers) may push either way
+            assert reverse.length() == pytest.approx(mtv.length(), abs=1e-6)
+            move_shape(b, reverse * 1.001)
+            assert physics.collide(b, a) is None
+            move_shape(b, -reverse * 1.001)
+        if kind1 == "rect" and kind2 != "rect":
+            # rects move whole pixels -- move the other shape out instead
+            move_shape(b, -mtv * 1.001)
+        else:
+            move_shape(a, mtv * 1.001)
+        assert physics.collide(a, b) is None
+    assert checked > 20
+
+
+# ------------------------------- #
+# broadphase
+
+
+class Box:
+    """Just a rect -- all the spatial hash needs"""
+
+    def __init__(self, *rect):
+        self.rect = pygame.Rect(rect)
+
+
+def test_spatial_hash():
+    grid = physics.SpatialHash(64)
+    a, b, c = Box(0, 0, 10, 10), Box(100, 100, 200, 20), Box(-70, 0, 10, 10)
+    for box in (a, b, c):
+        grid.update(box)
+    assert len(grid) == 3 and b in grid
+    assert grid.query(pygame.Rect(0, 0, 1, 1)) == [a]
+    assert grid.query(pygame.Rect(250, 110, 1, 1)) == [b]
+    assert grid.query(pygame.Rect(-64, 0, 1, 1)) == [c]
+    # each entity once, even across many cells
+    assert sorted(map(id, grid.query(pygame.Rect(-100, -100, 500, 500)))) == sorted(map(id, (a, b, c)))
+    # moving re-buckets
+    b.rect.topleft = (0, 0)
+    grid.update(b)
+    assert grid.query(pygame.Rect(250, 110, 1, 1)) == []
+    assert len(grid.query(pygame.Rect(0, 0, 1, 1))) == 2
+    grid.remove(b)
+    grid.remove(b)
+    assert grid.query(pygame.Rect(0, 0, 1, 1)) == [a]
+    assert len(grid) == 2 and b not in grid
+    # empty cells are dropped
+    grid.remove(a)
+    grid.remove(c)
+    assert not grid._cells
+
+
+def test_removed_colliders_leave_the_spatial_hash():
+    sc, layer = make_layer()
+    aspect = base_objects.Collision2DAspect()
+    layer.add_aspect(aspect)
+    walls = []
+    for i in range(3):
+        wall = physics.Entity()
+        wall.static = True
+        wall.position.xy = (i * 40, 0)
+        wall.area = (30, 30)
+        layer.add_entity(wall)
+        wall.add_component(base_objects.Collision2DComponent((0, 0)))
+        walls.append(wall)
+    area = pygame.Rect(-50, -50, 200, 100)
+    assert len(list(aspect.iterate_collisions(area))) == 3
+    walls[0].remove_component(base_objects.Collision2DComponent)
+    layer.remove_entity(walls[1])
+    assert list(aspect.iterate_collisions(area)) == [walls[2]]
+    assert len(layer.spatial_hash) == 1
+    assert not walls[0].entity_has_component(base_objects.Collision2DComponent)
+    SORA.DELTA = 1 / 60
+    sc.update()
+    assert list(aspect.iterate_collisions(area)) == [walls[2]]
+
+
+def test_statics_moved_by_hand_are_resynced():
+    sc, layer = make_layer()
+    aspect = base_objects.Collision2DAspect()
+    layer.add_aspect(aspect)
+    wall = physics.Entity()
+    wall.static = True
+    wall.area = (30, 30)
+    layer.add_entity(wall)
+    wall.add_component(base_objects.Collision2DComponent((0, 0)))
+    # placed after the component is added
+    wall.position.xy = (700, 300)
+    SORA.DELTA = 1 / 60
+    sc.update()
+    assert wall.rect.center == (700, 300)
+    assert list(aspect.iterate_collisions(pygame.Rect(690, 290, 5, 5))) == [wall]
+    assert list(aspect.iterate_collisions(pygame.Rect(-10, -10, 20, 20))) == []
+    assert wall.c_chunk == [700 // layer._options["chunkpixw"], 300 // layer._options["chunkpixh"]]
+
+
+def add_static(layer, position, area):
+    """A static rect collider"""
+    wall = physics.Entity()
+    wall.static = True
+    wall.area = area
+    wall.position.xy = position
+    layer.add_entity(wall)
+    wall.add_component(base_objects.Collision2DComponent((0, 0)))
+    return wall
+
+
+@pytest.mark.parametrize("shaped", [False, True])
+def test_continuous_movement_does_not_tunnel(shaped):
+    sc, layer = make_layer()
+    layer.add_aspect(base_objects.Collision2DAspect())
+    wall = add_static(layer, (200, 100), (2, 200))
+    if shaped:
+        mover = ball.Ball(5)
+        mover.update = lambda: None
+    else:
+        mover = physics.Entity()
+        mover.area = (10, 10)
+    mover.position.xy = (50, 100)
+    layer.add_entity(mover)
+    if not shaped:
+        mover.add_component(base_objects.Collision2DComponent(continuous=True))
+    SORA.DELTA = 1 / 30
+    sc.update()
+    # 200 px a frame against a 2 px wall
+    mover.velocity.xy = (6000, 0)
+    for _ in range(10):
+        sc.update()
+        assert mover.rect.right <= wall.rect.left + 1
+    assert mover.velocity.x == 0
+    assert mover.position.x == pytest.approx(wall.rect.left - 5, abs=1)
+
+
+def test_continuous_movement_slides_on_a_floor():
+    sc, layer = make_layer()
+    layer.add_aspect(base_objects.Collision2DAspect())
+    # tiles -- the next one is always ahead of the ball + only touching it
+    top = add_static(layer, (0, 220), (20, 4)).rect.top
+    for x in range(20, 400, 20):
+        add_static(layer, (x, 220), (20, 4))
+    b = ball.Ball(5)
+    b.position.xy = (50, 100)
+    layer.add_entity(b)
+    SORA.DELTA = 1 / 30
+    for _ in range(100):
+        sc.update()
+    # resting on the floor
+    assert b.position.y == pytest.approx(top - 5, abs=1)
+    assert b.velocity.y >= 0
+    x = b.position.x
+    for _ in range(10):
+        b.velocity.x = 300
+        sc.update()
+    assert b.position.x == pytest.approx(x + 100, abs=1)
+    assert b.position.y == pytest.approx(top - 5, abs=1)
+
+
+def test_area_sweep_matches_brute_force():
+    sc, layer = make_layer()
+    layer.add_aspect(base_objects.Collision2DAspect())
+    aspect = base_objects.Area2DAspect()
+    layer.add_aspect(aspect)
+    rng = np.random.default_rng(2)
+    events = []
+    areas, bodies = [], []
+    for _ in range(15):
+        e = physics.Entity()
+        e.position.xy = rng.uniform(0, 600, 2)
+        layer.add_entity(e)
+        e.rect.size = rng.integers(10, 120, 2).tolist()
+        c = base_objects.Area2D(*e.rect.size)
+        for kind in ("enter", "overlap", "exit"):
+            getattr(c, kind + "_signal_register").add_receiver(
+                signal.Receiver(lambda other, kind=kind, e=e: events.append((kind, hash(e), hash(other))))
+            )
+        e.add_component(c)
+        areas.append(e)
+    for _ in range(40):
+        e = physics.Entity()
+        e.position.xy = rng.uniform(0, 600, 2)
+        layer.add_entity(e)
+        e.add_component(base_objects.Collision2DComponent((0, 0)))
+        e.rect.size = (12, 12)
+        bodies.append(e)
+    SORA.DELTA = 1 / 60
+    sc.update()
+    signal.handle_signals()
+    events.clear()
+
+    def overlapping():
+        return {(hash(a), hash(b)) for a in areas for b in bodies if a.rect.colliderect(b.rect)}
+
+    previous = overlapping()
+    seen, shared = 0, 0
+    for _ in range(60):
+        for b in bodies:
+            b.velocity.xy = rng.uniform(-600, 600, 2)
+        sc.update()
+        signal.handle_signals()
+        current = overlapping()
+        assert set(aspect.overlapped) == current
+        expected = (
+            [("enter",) + p for p in current - previous]
+            + [("overlap",) + p for p in current & previous]
+            + [("exit",) + p for p in previous - current]
+        )
+        assert sorted(events) == sorted(expected)
+        seen += len(events)
+        # a body in two areas gets events from each
+        shared += len(current) - len({b for _, b in current})
+        events.clear()
+        previous = current
+    assert seen > 0 and shared > 0
+
+
+# ------------------------------- #
+# particles
+
+
+def test_particle_cap():
+    h = physics.ParticleHandler(max_particles=10)
+    h["interval"] = 0
+    h.emit(25)
+    assert len(h) == len(h._particles) == 10
+    # dead slots are reused with a new generation
+    first = sorted(h._particles)
+    for particle in list(h._particles.values())[:4]:
+        h.remove_particle(particle)
+    SORA.DELTA = 0
+    h.update()
+    assert len(h) == 6
+    h.emit(25)
+    assert len(h) == 10
+    assert len(set(h._particles) & set(first)) == 6
+
+
+def test_array_particle_cap():
+    h = physics.ArrayParticleHandler(max_particles=10)
+    h.emit(25)
+    assert len(h) == 10
+    ids = h.ids.copy()
+    assert len(set(ids.tolist())) == 10
+    assert [h.index_of(pid) for pid in ids] == list(range(10))
+    # kill 4 -- their ids go dead, the rest keep theirs
+    h.remove_particle(np.array([1, 3, 5, 7]))
+    h.cull()
+    assert len(h) == 6
+    for i, pid in enumerate(ids.tolist()):
+        index = h.index_of(pid)
+        assert (index == -1) == (i in (1, 3, 5, 7))
+        if index >= 0:
+            assert h.ids[index] == pid
+    h.emit(25)
+    assert len(h) == 10
+    assert not set(h.ids.tolist()) & {int(ids[i]) for i in (1, 3, 5, 7)}
+
+
+def test_killed_array_handler_still_steps():
+    h = physics.ArrayParticleHandler(max_particles=10)
+    h.emit(5)
+    h.kill()
+    assert not h._alive
+    h.lives[:2] = 0
+    SORA.DELTA = 1 / 60
+    h.step()
+    assert len(h) == 3
+
+
+def test_particle_system_keeps_the_handler_cap():
+    sc, layer = make_layer()
+    system = physics.ParticleSystem()
+    layer.add_aspect(system)
+    handlers = [physics.ArrayParticleHandler(max_particles=10) for _ in range(2)]
+    for h in handlers:
+        h["interval"] = 0
+        layer.add_entity(h)
+    SORA.DELTA = 1 / 60
+    sc.update()
+    ids = handlers[0].emit(25)
+    assert len(ids) == 10
+    assert len(handlers[0].emit(5)) == 0
+    assert len(handlers[1].emit(4)) == 4
+    assert len(handlers[0]) == 10 and len(handlers[1]) == 4 and len(system) == 14
+    # the particles live in the system's storage
+    storage = handlers[0].storage
+    assert storage is not handlers[0]
+    for pid in ids.tolist():
+        assert storage.ids[handlers[0].index_of(pid)] == pid
+    assert handlers[1].index_of(int(ids[0])) == -1
+    # dead particles free up the handler's cap
+    storage.remove_particle(np.array([handlers[0].index_of(int(pid)) for pid in ids[:3]]))
+    storage.cull()
+    assert len(handlers[0]) == 7
+    assert handlers[0].index_of(int(ids[0])) == -1
+    assert len(handlers[0].emit(25)) == 3
@@ -0,0 +1,331 @@
+"""
+Water tests
+- runs headless with SDL's dummy video driver
+
+usage:
+    python -m pytest -q test_water.py
+"""
+
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pytest
+import soragl as SORA
+from soragl import smath, scene, physics, base_objects, signal
+
+SORA.initialize({"window_size": [320, 180], "framebuffer_size": [320, 180]})
+SORA.create_context()
+
+from scripts import water, ball
+
+
+def make_water(width: int = 300, resolution: float = 3) -> water.Water:
+    """Create a water body that never sleeps"""
+    w = water.Water(width, 64, {"resolution": resolution, "sleep_energy": -1})
+    w.position.xy = (width / 2, 32)
+    return w
+
+
+def make_scene(*bodies, config: dict = None):
+    """Put water bodies in a scene stepped by a WaterAspect"""
+    sc = scene.Scene(config=scene.load_config(scene.Scene.DEFAULT_CONFIG))
+    layer = sc.make_layer(sc.get_config(), 1)
+    for body in bodies:
+        layer.add_entity(body)
+    layer.add_aspect(base_objects.SpriteRendererAspect())
+    aspect = water.WaterAspect(config)
+    layer.add_aspect(aspect)
+    SORA.DELTA = 1 / 60
+    sc.update()
+    return sc, aspect
+
+
+# ------------------------------- #
+# solver
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 7, 64, 1000])
+def test_solve_tridiagonal_matches_dense(n):
+    rng = np.random.default_rng(n)
+    lower, upper = rng.uniform(-1, 1, n), rng.uniform(-1, 1, n)
+    diag = 2 + np.abs(lower) + np.abs(upper) + rng.random(n)
+    rhs = rng.uniform(-10, 10, n)
+    dense = np.diag(diag) + np.diag(lower[1:], -1) + np.diag(upper[:-1], 1)
+    x = smath.solve_tridiagonal(lower, diag, upper, rhs)
+    assert x == pytest.approx(np.linalg.solve(dense, rhs))
+
+
+def test_implicit_water_is_stable():
+    w = water.Water(300, 64, {"resolution": 3, "sleep_energy": -1, "integrator": water.IMPLICIT, "spread": 50})
+    w.splash(5, 100)
+    for _ in range(500):
+        w.surface.advance(w.surface.clock.timestep)
+    assert np.all(np.isfinite(w.surface.heights))
+    assert np.abs(w.surface.heights).max() < 100
+
+
+# ------------------------------- #
+# splashes
+
+
+@pytest.mark.parametrize("radius", [1, 2.5, 8, 30])
+def test_splash_adds_the_same_impulse_at_any_radius(radius):
+    velocities = np.zeros(200)
+    water.splash_springs(velocities, np.array([100.0, 3.0]), np.array([2.0, -1.0]), np.array([radius, radius]))
+    assert velocities.sum() == pytest.approx(1.0)
+    assert np.count_nonzero(velocities) >= min(2 * int(radius), 2)
+
+
+def test_empty_splash_batch():
+    w = make_water()
+    # a rain frame without any drops
+    w.splash_at(np.array([]), np.array([]))
+    w.surface.advance(w.surface.clock.timestep)
+    w.splash_at(150, 20)
+    w.surface.advance(w.surface.clock.timestep)
+    assert np.abs(w.surface.heights).max() > 0
+
+
+def test_splash_before_packing_is_applied():
+    # a bare surface is only ever stepped by the aspect
+    body = physics.Entity()
+    surface = water.WaterSurface(300, 3, dict(water.DEFAULT_CONFIG, sleep_energy=-1), 64)
+    sc, aspect = make_scene(body)
+    body.add_component(surface)
+    surface.splash(150, 30, 20)
+    for _ in range(3):
+        sc.update()
+    assert surface.managed
+    assert not surface._splashes
+    assert np.abs(surface.heights).max() > 0
+
+
+# ------------------------------- #
+# water aspect
+
+
+def run_aspect(workers: int, bodies: int = 12, frames: int = 30):
+    """Step bodies in a WaterAspect -- returns every spring height at the end"""
+    waters = [make_water(resolution=0.5) for _ in range(bodies)]
+    sc, aspect = make_scene(*waters, config={"workers": workers})
+    try:
+        for f in range(frames):
+            if f % 7 == 3:
+                for i, w in enumerate(waters):
+                    w.splash(i % 10, 5 + i)
+            sc.update()
+        aspect.sync()
+        return np.concatenate([w.surface.heights for w in waters])
+    finally:
+        aspect.close()
+
+
+def test_pool_matches_serial():
+    serial = run_aspect(0)
+    assert np.abs(serial).max() > 0
+    np.testing.assert_allclose(run_aspect(2), serial)
+
+
+def count_packs(aspect):
+    """Count the aspect's repacks -- returns a one item list"""
+    packs = [0]
+    pack = aspect.pack
+
+    def counted():
+        packs[0] += 1
+        pack()
+
+    aspect.pack = counted
+    return packs
+
+
+def test_floating_does_not_repack():
+    w = water.Water(300, 50)
+    w.position.xy = (200, 200)
+    sc = scene.Scene(config=scene.load_config(scene.Scene.DEFAULT_CONFIG))
+    layer = sc.make_layer(sc.get_config(), 1)
+    layer.add_entity(w)
+    aspect = water.WaterAspect()
+    for a in (base_objects.Collision2DAspect(), base_objects.Area2DAspect(), aspect, water.BuoyancyAspect()):
+        layer.add_aspect(a)
+    b = ball.Ball(8)
+    b.position.xy = (200, 150)
+    layer.add_entity(b)
+    SORA.DELTA = 1 / 60
+    for _ in range(300):
+        sc.update()
+        signal.handle_signals()
+    # the ball floats + the water has settled
+    assert w.rect.top < b.position.y < w.rect.bottom
+    assert w.surface.asleep
+    packs = count_packs(aspect)
+    for _ in range(300):
+        sc.update()
+        signal.handle_signals()
+    assert w.surface.asleep
+    assert packs[0] == 0
+
+
+def test_sleeping_keeps_the_slot():
+    waters = [make_water() for _ in range(3)]
+    waters[0].surface.sleep_energy = 1e-4
+    waters[0].splash(10, 40)
+    sc, aspect = make_scene(*waters)
+    sc.update()
+    packs = count_packs(aspect)
+    for _ in range(600):
+        sc.update()
+        if waters[0].surface.asleep:
+            break
+    assert waters[0].surface.asleep and packs[0] == 0
+    # the flat slot is still stepped with the rest -- waking it is free
+    assert waters[0].surface in aspect._surfaces
+    waters[0].splash(10, 40)
+    sc.update()
+    assert not waters[0].surface.asleep and packs[0] == 0
+    assert np.abs(waters[0].surface.heights).max() > 0
+    # once most of the springs are flat they are packed out
+    for w in waters[1:]:
+        w.surface.sleep()
+    sc.update()
+    assert packs[0] == 1 and aspect._surfaces == [waters[0].surface]
+
+
+# ------------------------------- #
+# surface queries
+
+
+def test_sample_surface_scalar_matches_array():
+    w = make_water()
+    w.surface.heights[:] = np.sin(w.surface.xs / 20)
+    xs = np.array([10.0, 100.0, 250.0])
+    heights, slopes, normals = w.sample_surface(xs)
+    for i, x in enumerate(xs):
+        height, slope, normal = w.sample_surface(x)
+        assert isinstance(height, float)
+        assert height == pytest.approx(heights[i])
+        assert slope == pytest.approx(slopes[i])
+        assert normal == pytest.approx(normals[i])
+
+
+def test_sample_surface_outside():
+    w = make_water()
+    height, slope, _ = w.sample_surface(-50)
+    assert np.isnan(height) and np.isnan(slope)
+    height, slope, _ = w.sample_surface(-50, clamp=True)
+    assert height == pytest.approx(w.surface_top() + w.surface.heights[0])
+    assert slope == 0
+
+
+# ------------------------------- #
+# snapshots
+
+
+def run_frames(w: water.Water, frames: int, delta: float, sc=None):
+    """Advance a body by uneven frames -- returns the heights after each one"""
+    result = []
+    for i in range(frames):
+        SORA.DELTA = delta * (1 + (i % 3) / 2)
+        if sc:
+            sc.update()
+        else:
+            w.surface.advance(SORA.DELTA)
+        result.append(w.surface.heights.copy())
+    return result
+
+
+def test_snapshot_replay_is_deterministic():
+    w = make_water()
+    w.splash(10, 40)
+    run_frames(w, 5, 1 / 70)
+    # a splash still queued when the snapshot is taken
+    w.splash(20, -30)
+    saved = w.snapshot()
+    first = run_frames(w, 20, 1 / 70)
+    # a splash queued after the snapshot is dropped by the restore
+    w.splash(30, 50)
+    w.restore(saved)
+    second = run_frames(w, 20, 1 / 70)
+    for a, b in zip(first, second):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_aspect_snapshot_replay_is_deterministic():
+    waters = [make_water(), make_water(width=200)]
+    sc, aspect = make_scene(*waters)
+    waters[0].splash(10, 40)
+    run_frames(waters[0], 5, 1 / 70, sc)
+    waters[1].splash(5, -30)
+    saved = aspect.snapshot()
+    accumulator = aspect.clock._accumulator
+    first = run_frames(waters[1], 20, 1 / 70, sc)
+    aspect.restore(saved)
+    assert aspect.clock._accumulator == accumulator
+    second = run_frames(waters[1], 20, 1 / 70, sc)
+    for a, b in zip(first, second):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_restoring_one_body_keeps_the_shared_clock():
+    waters = [make_water(), make_water()]
+    sc, aspect = make_scene(*waters)
+    waters[0].splash(10, 40)
+    run_frames(waters[0], 5, 1 / 70, sc)
+    saved = waters[0].snapshot()
+    run_frames(waters[0], 4, 1 / 70, sc)
+    accumulator = aspect.clock._accumulator
+    heights = waters[1].surface.heights.copy()
+    waters[0].restore(saved)
+    assert aspect.clock._accumulator == accumulator
+    np.testing.assert_array_equal(waters[1].surface.heights, heights)
+
+
+def test_restore_keeps_spacing_in_sync():
+    w = make_water()
+    w.set_lod(2)
+    saved = w.snapshot()
+    w.set_lod(0)
+    w.restore(saved)
+    assert w.lod == 2
+    assert w.section_w == w.surface.section_w == w.base_section_w << 2
+    assert w.const_volume == w.section_w / w.area[0]
+
+
+def test_restore_rejects_other_bodies():
+    w = make_water()
+    heights = w.surface.heights.copy()
+    with pytest.raises(ValueError):
+        w.restore(make_water(width=400).snapshot())
+    with pytest.raises(ValueError):
+        w.restore(w.snapshot()[:-8])
+    np.testing.assert_array_equal(w.surface.heights, heights)
+
+
+# ------------------------------- #
+# heightfield
+
+
+def test_heightfield_splash_keeps_the_volume():
+    solid = np.zeros((8, 8), dtype=bool)
+    solid[3, 5] = True
+    w = water.HeightfieldWater(80, 80, {"grid": (8, 8), "depth": 4.0}, solid=solid)
+    depth = w.surface.depth
+    volume = depth.sum()
+    w.splash((4, 3), 3)
+    # the hit cell is pushed down, its open neighbours rise -- not the wall
+    assert depth[3, 4] == pytest.approx(1)
+    assert depth[2, 4] == depth[4, 4] == depth[3, 3] == pytest.approx(5)
+    assert depth[3, 5] == 0
+    # more than the cell holds -- in a corner
+    w.splash((0, 0), 100)
+    assert depth[0, 0] == 0 and depth[0, 1] == depth[1, 0] == pytest.approx(6)
+    # pulled up
+    w.splash((7, 7), -2)
+    assert depth[7, 7] == pytest.approx(6) and depth[6, 7] == pytest.approx(3)
+    assert depth.sum() == pytest.approx(volume)
+    assert np.all(depth >= 0)
+    for _ in range(200):
+        w.surface.advance(1 / 60)
+        assert w.surface.depth.sum() == pytest.approx(volume)